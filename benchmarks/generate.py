@@ -0,0 +1,52 @@
+import random, mido
+
+def generate_midi(path : str, notes_per_second : float = 20, polyphony : int = 4, instruments : int = 1, length : float = 30, seed : int = 0) -> int:
+    """
+    Write a synthetic MIDI file with a controlled density, for benchmarking the parse, schedule and render paths.
+    Chords of `polyphony` notes start at an even rate so the file averages `notes_per_second`, each chord goes to the next instrument in turn.
+    @param path: str - Where to write the .mid file
+    @param notes_per_second: float - How many notes start per second across all instruments
+    @param polyphony: int - How many notes start together in each chord
+    @param instruments: int - How many instruments (tracks, each on its own channel) the chords are spread over
+    @param length: float - The length of the piece in seconds
+    @param seed: int - The random seed, the same arguments always give the same file
+    @return The number of notes written
+    """
+    random_generator = random.Random(seed)
+
+    ticks_per_beat, tempo = 480, 500000
+    chord_interval = polyphony / notes_per_second
+
+    tracks_events = [[] for _ in range(instruments)] # -> (tick, order, message), order puts note offs before note ons on the same tick
+    note_count, chord_index, chord_time = 0, 0, 0.0
+    while chord_time < length:
+        instrument = chord_index % instruments
+        channel = instrument % 16
+
+        for pitch in random_generator.sample(range(21, 109), polyphony):
+            duration = random_generator.uniform(0.05, min(2.0, max(0.1, chord_interval * 4)))
+            start = round(mido.second2tick(chord_time, ticks_per_beat, tempo))
+            end = max(start + 1, round(mido.second2tick(min(chord_time + duration, length), ticks_per_beat, tempo)))
+
+            tracks_events[instrument].append((start, 1, mido.Message('note_on', channel=channel, note=pitch, velocity=random_generator.randint(40, 120))))
+            tracks_events[instrument].append((end, 0, mido.Message('note_off', channel=channel, note=pitch, velocity=0)))
+            note_count += 1
+
+        chord_index += 1
+        chord_time = chord_index * chord_interval
+
+    midi_file = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    for instrument, events in enumerate(tracks_events):
+        track = mido.MidiTrack()
+        if instrument == 0:
+            track.append(mido.MetaMessage('set_tempo', tempo=tempo, time=0))
+        track.append(mido.Message('program_change', channel=instrument % 16, program=instrument % 128, time=0))
+
+        last_tick = 0
+        for tick, _, message in sorted(events, key=lambda event: event[:2]):
+            track.append(message.copy(time=tick - last_tick))
+            last_tick = tick
+        midi_file.tracks.append(track)
+
+    midi_file.save(path)
+    return note_count
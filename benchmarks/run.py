@@ -0,0 +1,191 @@
+from os import environ
+environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+environ['SDL_VIDEODRIVER'] = 'dummy' # -> Set before pygame is imported, so the render loop runs without a window
+environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import os, sys, json, time, platform, argparse, tempfile, threading, subprocess, tracemalloc
+
+from modules import Renderer
+from modules import ObjectController
+from modules.Piano import PianoVisualiser
+from modules.Midi import MidiParser
+
+from modules.Output import *
+from benchmarks.generate import generate_midi
+
+# name -> (notes per second, polyphony, instruments, length in seconds)
+SCENARIOS = {
+    'sparse': (8, 1, 1, 10),
+    'dense': (200, 8, 2, 10),
+    'orchestral': (400, 4, 16, 10),
+}
+
+class NullMidiOutput:
+    """
+    Stands in for rtmidi.MidiOut so the numbers measure this code and not whatever synth is on the machine.
+    """
+    def __init__(self) -> None:
+        self.messages : int = 0
+
+    def get_ports(self) -> list:
+        return ['Null']
+
+    def open_port(self, port = 0) -> bool:
+        return True
+
+    def send_message(self, message) -> None:
+        self.messages += 1
+
+class ThreadSampler:
+    def __init__(self, interval : float = 0.005) -> None:
+        """
+        Sample the number of live threads in the background, not counting the sampler itself.
+        @param interval: float - Seconds between samples
+        @return None
+        """
+        self.interval : float = interval
+        self.peak : int = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.sample, name='ThreadSampler', daemon=True)
+
+    def sample(self) -> None:
+        while not self.stopping.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.stopping.set()
+        self.thread.join()
+
+def measure_parse(midi_file : str, repeats : int) -> dict:
+    """
+    Time MidiParser.deserialize_midi into both the note dictionary and the note table, with no cache.
+    @param midi_file: str - The file to parse
+    @param repeats: int - How many times each parse is run, the best time is kept
+    @return A dictionary per mode with the best and mean time in milliseconds and the peak traced memory in bytes
+    """
+    results = {}
+    for mode, as_table in (('dict', False), ('table', True)):
+        times = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            MidiParser().deserialize_midi(midi_file, as_table)
+            times.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        MidiParser().deserialize_midi(midi_file, as_table)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[mode] = {'best_ms': min(times) * 1000, 'mean_ms': sum(times) / len(times) * 1000, 'peak_bytes': peak}
+    return results
+
+def measure_playback(midi_file : str, rate : float, pacing_mode : str, dirty_rendering : bool) -> dict:
+    """
+    Play a file through play_notes_in_time while Scene.run renders it, then collect the scheduler, output and frame statistics.
+    @param midi_file: str - The file to play
+    @param rate: float - The playback rate, above 1 to get through long files quicker
+    @param pacing_mode: str - The Scene pacing mode, uncapped measures the most frames the render loop can do
+    @param dirty_rendering: bool - Whether the scene only redraws the rects that changed
+    @return A dictionary with the scheduler jitter, the MIDI output lag, the peak thread count and the pacing statistics
+    """
+    render_Manager = Renderer.Scene("Piano Visualiser Benchmark", dirty_rendering=dirty_rendering, pacing_mode=pacing_mode)
+    objManager = ObjectController.ObjectManager()
+
+    piano_Visualiser = PianoVisualiser(objManager, render_Manager)
+    piano_Visualiser.midi_synthesier.midi_out = NullMidiOutput()
+    piano_Visualiser.set_playback_rate(rate)
+    objManager.populate(0, piano_Visualiser.draw_keys)
+    render_Manager.fill_scene(objManager.objects)
+
+    def play():
+        midParser = MidiParser()
+        piano_Visualiser.play_midi(midParser, midParser.deserialize_midi(midi_file, piano_Visualiser.use_note_table))
+        piano_Visualiser.midi_synthesier.close()
+        render_Manager.running = False
+
+    started = time.perf_counter()
+    with ThreadSampler() as sampler:
+        threading.Thread(target=play, name='Playback', daemon=True).start()
+        render_Manager.run([])
+
+    return {
+        'wall_s': time.perf_counter() - started,
+        'rate': rate,
+        'scheduler_jitter': piano_Visualiser.scheduler_stats,
+        'midi_output': piano_Visualiser.midi_synthesier.get_send_stats(),
+        'peak_threads': sampler.peak,
+        'render': render_Manager.pacer.get_stats(),
+    }
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing, scheduling and rendering on synthetic MIDI files, writing the results as JSON.')
+    parser.add_argument('--scenario', action='append', choices=tuple(SCENARIOS), help='A preset density to run, can be given more than once, all of them by default')
+    parser.add_argument('--notes-per-second', type=float, default=None, help='Run a custom density instead of the presets')
+    parser.add_argument('--polyphony', type=int, default=None, help='Overrides the preset polyphony, 4 for a custom density')
+    parser.add_argument('--instruments', type=int, default=None, help='Overrides the preset instrument count, 1 for a custom density')
+    parser.add_argument('--length', type=float, default=None, help='Overrides the preset length in seconds, 10 for a custom density')
+    parser.add_argument('--repeats', type=int, default=3, help='How many times each parse is timed')
+    parser.add_argument('--rate', type=float, default=1.0, help='The playback rate, up to 4')
+    parser.add_argument('--pacing', default='uncapped', choices=('uncapped', 'fixed', 'vsync', 'adaptive'))
+    parser.add_argument('--full-redraw', action='store_true', help='Redraw the whole screen every frame instead of the dirty rects')
+    parser.add_argument('--skip-playback', action='store_true', help='Only measure parsing')
+    parser.add_argument('--output', default='benchmark.json')
+    arguments = parser.parse_args()
+
+    if arguments.notes_per_second is not None:
+        scenarios = {'custom': (arguments.notes_per_second, 4, 1, 10)}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in (arguments.scenario or SCENARIOS)}
+
+    # Any shape given on the command line replaces the preset's own, so a preset can be stretched or thickened without spelling out a custom density
+    for name, (notes_per_second, polyphony, instruments, length) in scenarios.items():
+        scenarios[name] = (
+            notes_per_second,
+            polyphony if arguments.polyphony is None else arguments.polyphony,
+            instruments if arguments.instruments is None else arguments.instruments,
+            length if arguments.length is None else arguments.length,
+        )
+
+    report = {
+        'commit': get_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scenarios': {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (notes_per_second, polyphony, instruments, length) in scenarios.items():
+            midi_file = os.path.join(directory, f'{name}.mid')
+            note_count = generate_midi(midi_file, notes_per_second, polyphony, instruments, length)
+            warn(f'{name}: {note_count} notes, {notes_per_second} notes/s, polyphony {polyphony}, {instruments} instruments, {length}s')
+
+            result = {
+                'notes_per_second': notes_per_second,
+                'polyphony': polyphony,
+                'instruments': instruments,
+                'length_s': length,
+                'notes': note_count,
+                'parse': measure_parse(midi_file, max(1, arguments.repeats)),
+            }
+            if not arguments.skip_playback:
+                result['playback'] = measure_playback(midi_file, arguments.rate, arguments.pacing, not arguments.full_redraw)
+
+            report['scenarios'][name] = result
+
+    with open(arguments.output, 'w') as file:
+        json.dump(report, file, indent=4)
+    output(f'Wrote the benchmark results to {arguments.output}')
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+from os import environ
+environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+environ['SDL_VIDEODRIVER'] = 'dummy' # -> Set before pygame is imported, here and in every worker process since they import this module
+environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import os, math, time, argparse, pygame, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import Renderer
+from modules import ObjectController
+from modules.Piano import PianoVisualiser
+from modules.Midi import MidiParser
+from modules.MidiCache import MidiCache
+from modules.NoteIndex import NoteIndex
+from modules.Clock import VirtualClock
+
+from modules.Output import *
+
+def build_scene(midi_file : str, cache_dir : str):
+    """
+    Build a scene, keyboard and note index for rendering frames off screen.
+    @param midi_file: str - The MIDI file to render
+    @param cache_dir: str - The MIDI cache directory, the note table is memory-mapped from it
+    @return A tuple of the scene, the piano visualiser, the note index and the virtual clock
+    """
+    render_Manager = Renderer.Scene("Piano Visualiser Export", pacing_mode='uncapped')
+    objManager = ObjectController.ObjectManager()
+
+    piano_Visualiser = PianoVisualiser(objManager, render_Manager)
+    objManager.populate(0, piano_Visualiser.draw_keys)
+
+    render_Manager.fill_scene(objManager.objects)
+    render_Manager.apply_render_commands()
+
+    note_index = NoteIndex(MidiParser(MidiCache(cache_dir)).deserialize_midi(midi_file, True))
+
+    clock = VirtualClock()
+    piano_Visualiser.note_animator.get_piece_time = clock.now
+    piano_Visualiser.note_animator.load(note_index)
+
+    return render_Manager, piano_Visualiser, note_index, clock
+
+worker_scene = None # -> Built once per worker process by init_worker, then reused for every frame range it gets
+
+def init_worker(midi_file : str, cache_dir : str) -> None:
+    global worker_scene
+    worker_scene = build_scene(midi_file, cache_dir)
+
+def render_frames(job : tuple) -> str:
+    """
+    Render a range of frames, each one computed purely from the note table and its own timestamp.
+    @param job: tuple - (output, file_format, fps, first_frame, last_frame)
+    @return The path of the raw chunk that was written, or the output directory for png frames
+    """
+    output_path, file_format, fps, first_frame, last_frame = job
+    render_Manager, piano_Visualiser, note_index, clock = worker_scene
+
+    keys_by_pitch = {pitch: piano_Visualiser.get_shape_by_pitch(pitch) for pitch in range(128)}
+    for shape in piano_Visualiser.keys:
+        shape.colour = shape.original_colour
+    pressed = set()
+    pedal_down = None
+
+    chunk_path = f'{output_path}.{first_frame:08d}.part'
+    chunk = open(chunk_path, 'wb') if file_format == 'raw' else None
+
+    for frame in range(first_frame, last_frame):
+        piece_time = frame / fps
+        clock.set_time(piece_time)
+
+        sounding = note_index.query(piece_time, piece_time)
+        now_pressed = set(sounding.pitch[sounding.start <= piece_time].tolist())
+
+        for pitch in pressed ^ now_pressed:
+            shape = keys_by_pitch[pitch]
+            if shape:
+                shape.colour = piano_Visualiser.KEY_DOWN_COLOUR if pitch in now_pressed else shape.original_colour
+        pressed = now_pressed
+
+        now_pedal_down = bool(note_index.sustained_instruments(piece_time))
+        if now_pedal_down != pedal_down:
+            pedal_down = now_pedal_down
+            piano_Visualiser.pedal_shape.colour = piano_Visualiser.PEDAL_DOWN_COLOUR if pedal_down else piano_Visualiser.PEDAL_UP_COLOUR
+
+        render_Manager.draw_full()
+
+        if chunk:
+            chunk.write(pygame.image.tobytes(render_Manager.screen, 'RGB'))
+        else:
+            pygame.image.save(render_Manager.screen, os.path.join(output_path, f'frame_{frame:08d}.png'))
+
+    if chunk:
+        chunk.close()
+        return chunk_path
+    return output_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a MIDI file to a png frame sequence or raw rgb24 video, faster than real time.')
+    parser.add_argument('midi_file')
+    parser.add_argument('output', help='A directory for png frames, or a file for raw video')
+    parser.add_argument('--format', choices=('png', 'raw'), default='png')
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--tail', type=float, default=2.0, help='Seconds to keep rendering after the last note ends')
+    parser.add_argument('--cache-dir', default=None)
+    arguments = parser.parse_args()
+
+    started = time.perf_counter()
+
+    # Parse once up front so the cache is warm and every worker just memory-maps the note table
+    cache = MidiCache(arguments.cache_dir)
+    note_table = MidiParser(cache).deserialize_midi(arguments.midi_file, True)
+    if len(note_table) <= 0:
+        error('Nothing to export.')
+        return
+
+    length = float(note_table.end.max()) + arguments.tail
+    total_frames = math.ceil(length * arguments.fps)
+
+    if arguments.format == 'png':
+        os.makedirs(arguments.output, exist_ok=True)
+
+    workers = max(1, arguments.workers)
+    chunk_size = max(1, math.ceil(total_frames / (workers * 4)))
+    jobs = [(arguments.output, arguments.format, arguments.fps, first, min(first + chunk_size, total_frames)) for first in range(0, total_frames, chunk_size)]
+
+    warn(f'Exporting {total_frames} frames ({length:.1f}s at {arguments.fps} FPS) with {workers} workers.')
+    # Spawned rather than forked, so the workers never inherit a lock one of this process's threads was holding
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker, initargs=(arguments.midi_file, cache.cache_dir)) as pool:
+        results = list(pool.map(render_frames, jobs))
+
+    if arguments.format == 'raw':
+        with open(arguments.output, 'wb') as video:
+            for chunk_path in results:
+                with open(chunk_path, 'rb') as chunk:
+                    while data := chunk.read(16 * 1024 * 1024):
+                        video.write(data)
+                os.remove(chunk_path)
+
+        output(f'Play it with: ffplay -f rawvideo -pixel_format rgb24 -video_size 1280x720 -framerate {arguments.fps} {arguments.output}')
+
+    elapsed = time.perf_counter() - started
+    output(f'Exported {total_frames} frames in {elapsed:.1f}s ({length / elapsed:.1f}x real time).')
+
+if __name__ == "__main__":
+    main()
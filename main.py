@@ -1,24 +1,74 @@
 from os import environ
 environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
 
-from modules import Renderer
-from modules import ObjectController
-from modules.Piano import PianoVisualiser
+import argparse
+
+from modules.Startup import startup # -> First, so the report's clock starts before the heavy imports
+
+with startup.stage('import renderer'):
+    from modules import Renderer
+    from modules import ObjectController
+with startup.stage('import visualiser'):
+    from modules.Piano import PianoVisualiser
+    from modules.Latency import LatencyOverlay
+    from modules.Profiler import profiler, ProfilerOverlay
+    from modules.Playlist import get_playlist_files
 
 from modules.Shapes import *
 from modules.Output import *
 
 def main():
-    render_Manager = Renderer.Scene("Piano Visualiser")
-    objManager = ObjectController.ObjectManager()
+    parser = argparse.ArgumentParser(description='Piano Visualiser')
+    parser.add_argument('--live', action='store_true', help='Visualise a MIDI keyboard instead of playing a file')
+    parser.add_argument('--playlist', nargs='+', default=None, help='MIDI files or directories to play one after another')
+    parser.add_argument('--repeat', action='store_true', help='Start the playlist over once it ends')
+    parser.add_argument('--stream', action='store_true', help='Start playing the file while it is still being read, instead of parsing all of it first')
+    parser.add_argument('--port', type=int, default=0, help='The MIDI input port for --live')
+    parser.add_argument('--record', default=None, help='Record the --live input to this MIDI file')
+    parser.add_argument('--latency-overlay', action='store_true', help='Show the MIDI in to screen latency')
+    parser.add_argument('--latency-json', default=None, help='Write the latency statistics to this file on exit')
+    parser.add_argument('--log-level', default='print', choices=('debug', 'print', 'warn', 'error'), help='The lowest level of log line written')
+    parser.add_argument('--log-file', default=None, help='Also append the log to this file')
+    parser.add_argument('--profile', action='store_true', help='Show how long each stage of a frame takes')
+    parser.add_argument('--trace', default=None, help='Write a Chrome trace of the session to this file on exit')
+    parser.add_argument('--startup-report', action='store_true', help='Show how long each stage of startup took once the first frame is shown')
+    arguments = parser.parse_args()
+
+    configure(arguments.log_level, arguments.log_file)
 
-    piano_Visualiser = PianoVisualiser(objManager, render_Manager)
-    objManager.populate(0, piano_Visualiser.draw_keys)
+    if arguments.profile or arguments.trace:
+        profiler.enable()
+    startup.enabled = arguments.startup_report
+
+    with startup.stage('create scene'):
+        render_Manager = Renderer.Scene("Piano Visualiser", dirty_rendering=True)
+        objManager = ObjectController.ObjectManager()
+
+    with startup.stage('create visualiser'):
+        piano_Visualiser = PianoVisualiser(objManager, render_Manager)
+        objManager.populate(0, piano_Visualiser.draw_keys)
 
     warn(f"Successfully populated the scene with {len(objManager.objects)}")
 
     render_Manager.fill_scene(objManager.objects)
-    render_Manager.run([[piano_Visualiser.play_midi_thread, piano_Visualiser]])
+    render_Manager.latency_json_path = arguments.latency_json
+    if arguments.latency_overlay:
+        render_Manager.add_animator(LatencyOverlay(render_Manager.latency_tracker))
+    render_Manager.trace_path = arguments.trace
+    if arguments.profile:
+        render_Manager.add_animator(ProfilerOverlay(profiler))
+
+    if arguments.live:
+        piano_Visualiser.live_port = arguments.port
+        piano_Visualiser.record_path = arguments.record
+        render_Manager.run([[piano_Visualiser.play_live_thread, piano_Visualiser]])
+    elif arguments.playlist:
+        piano_Visualiser.playlist = get_playlist_files(arguments.playlist)
+        piano_Visualiser.repeat_playlist = arguments.repeat
+        render_Manager.run([[piano_Visualiser.play_playlist_thread, piano_Visualiser]])
+    else:
+        piano_Visualiser.stream_playback = arguments.stream
+        render_Manager.run([[piano_Visualiser.play_midi_thread, piano_Visualiser]])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,116 @@
+import pygame, numpy
+
+from modules.NoteIndex import NoteIndex
+from modules.Keyboard import KeyboardLayout
+from modules.RectBatch import RectBatchRenderer
+
+class NoteAnimator:
+    def __init__(self, get_piece_time, keyboard : KeyboardLayout, key_top : float, note_scale : float = 100, colour = (255, 0, 255)) -> None:
+        """
+        Compute the rising note rectangles from the playback clock once per frame, on the render thread.
+        @param get_piece_time - Callable returning the current piece time in seconds
+        @param keyboard: KeyboardLayout - The per pitch key geometry
+        @param key_top: float - The y position the notes rise from
+        @param note_scale: float - Pixels per second of piece time
+        @param colour - The colour of the rising notes
+        @return None
+        """
+        self.get_piece_time = get_piece_time
+        self.keyboard : KeyboardLayout = keyboard
+
+        self.key_top : float = key_top
+        self.note_scale : float = note_scale
+        self.colour = colour
+        self.border_radius = 2
+        self.batch_renderer = RectBatchRenderer(border_radius=self.border_radius) # -> Dense passages are filled in bulk, with the same corners
+
+        self.index : NoteIndex = None
+        self.active = []
+
+        self.streaming = False
+        self.streamed_notes = [] # -> Filled by the playback thread in stream mode, emptied by the render thread
+
+        self.running = False
+
+    def load(self, notes) -> None:
+        """
+        Load the notes of a piece into an interval index, so each frame is one viewport query and seeking needs no extra work.
+        @param notes - A NoteIndex, a note table sorted by start, or a dictionary mapping start times to lists of notes
+        @return None
+        """
+        self.index = notes if isinstance(notes, NoteIndex) else NoteIndex(notes)
+        self.active = []
+        self.streaming = False
+        self.running = True
+
+    def load_stream(self) -> None:
+        """
+        Start a streamed piece, where the notes are handed over through add_notes as they are pressed since nothing is known ahead of time.
+        @return None
+        """
+        self.index = None
+        self.active = []
+        self.streamed_notes = []
+        self.streaming = True
+        self.running = True
+
+    def add_notes(self, note_array) -> None:
+        if self.streaming:
+            self.streamed_notes.append([note for note in note_array if not note.pedal])
+
+    def stop(self) -> None:
+        self.running = False
+        self.active = []
+
+    def get_visible_seconds(self) -> float:
+        return self.key_top / self.note_scale
+
+    def update(self, piece_time : float) -> list:
+        """
+        Compute the rectangle of every note visible at the given piece time.
+        @param piece_time: float - The current piece time
+        @return A list of (x, y, width, height) tuples
+        """
+        x, y, width, height = self.get_rect_arrays(piece_time)
+        return list(zip(x.tolist(), y.tolist(), width.tolist(), height.tolist()))
+
+    def get_rect_arrays(self, piece_time : float) -> tuple:
+        """
+        Compute the rectangles of the notes visible at the given piece time as arrays, without building a tuple per note.
+        @param piece_time: float - The current piece time
+        @return A tuple of the x, y, width and height arrays
+        """
+        oldest_visible = piece_time - self.get_visible_seconds()
+
+        if self.streaming:
+            while self.streamed_notes:
+                self.active += self.streamed_notes.pop(0)
+            self.active = [note for note in self.active if note.end > oldest_visible]
+
+            starts = numpy.fromiter((note.start for note in self.active), numpy.float64, len(self.active))
+            ends = numpy.fromiter((note.end for note in self.active), numpy.float64, len(self.active))
+            pitches = numpy.fromiter((note.pitch for note in self.active), numpy.intp, len(self.active))
+        elif self.index is not None:
+            visible = self.index.query(oldest_visible, piece_time)
+            starts, ends, pitches = visible.start, visible.end, visible.pitch
+        else:
+            return (numpy.empty(0),) * 4
+
+        x, width = self.keyboard.x[pitches], self.keyboard.width[pitches]
+
+        top = self.key_top - (piece_time - starts) * self.note_scale
+        bottom = self.key_top - numpy.maximum(0, piece_time - ends) * self.note_scale
+
+        on_keyboard = ~numpy.isnan(x)
+        return x[on_keyboard], top[on_keyboard], width[on_keyboard], (bottom - top)[on_keyboard]
+
+    def draw(self, surface) -> list:
+        if not self.running:
+            return []
+
+        x, y, width, height = self.get_rect_arrays(self.get_piece_time())
+        if self.batch_renderer.can_draw(surface, len(x)):
+            bounds = self.batch_renderer.draw(surface, x, y, width, height, self.colour)
+            return [bounds] if bounds else [] # one rect to erase next frame instead of one per note
+
+        return [pygame.draw.rect(surface, self.colour, rect, border_radius=self.border_radius) for rect in zip(x.tolist(), y.tolist(), width.tolist(), height.tolist())]
@@ -0,0 +1,164 @@
+import time, threading
+
+class PlaybackClock:
+    MIN_RATE = 0.25
+    MAX_RATE = 4.0
+
+    def __init__(self, rate : float = 1.0) -> None:
+        """
+        A piecewise-linear mapping from wall time to piece time. Every rate change, jump or loop wrap starts a new segment from the current point.
+        @param rate: float - Seconds of piece time per second of wall time
+        @return None
+        """
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock) # -> Notified on every change, so a thread waiting on the clock re-plans straight away
+
+        self.anchor_wall : float = time.perf_counter()
+        self.anchor_piece : float = 0.0
+        self.rate : float = self.clamp_rate(rate)
+
+        self.loop = None # -> (start, end) in piece time while an A-B loop is active
+
+        self.version : int = 0 # -> Bumped on every change, so anything sleeping on the clock knows to re-plan
+        self.jumps : int = 0 # -> Bumped only when the piece time is discontinuous (seek or loop wrap)
+
+    def clamp_rate(self, rate : float) -> float:
+        return min(self.MAX_RATE, max(self.MIN_RATE, rate))
+
+    def get_raw_time(self, wall_time : float) -> float:
+        return self.anchor_piece + (wall_time - self.anchor_wall) * self.rate
+
+    def reanchor(self, piece_time : float, wall_time : float) -> None:
+        # Only called with the lock held
+        self.anchor_piece, self.anchor_wall = piece_time, wall_time
+        self.bump()
+
+    def bump(self) -> None:
+        self.version += 1
+        self.changed.notify_all()
+
+    def get_time(self, wall_time : float) -> float:
+        # now() without taking the lock, for callers already holding it
+        piece_time = self.get_raw_time(wall_time)
+
+        if self.loop is not None and piece_time >= self.loop[1]:
+            loop_start, loop_end = self.loop
+            piece_time = loop_start + (piece_time - loop_start) % (loop_end - loop_start)
+
+            self.reanchor(piece_time, wall_time)
+            self.jumps += 1
+
+        return piece_time
+
+    def now(self) -> float:
+        """
+        Get the current piece time, wrapping back to the loop start once the loop end is passed.
+        @return The piece time in seconds
+        """
+        with self.lock:
+            return self.get_time(time.perf_counter())
+
+    def start(self, piece_time : float = 0.0) -> None:
+        """
+        Start the clock from a point in the piece, keeping the current rate and dropping any loop.
+        @param piece_time: float - The piece time to start at
+        @return None
+        """
+        with self.lock:
+            self.loop = None
+            self.reanchor(piece_time, time.perf_counter())
+            self.jumps += 1
+
+    def set_position(self, piece_time : float) -> None:
+        with self.lock:
+            self.reanchor(max(0.0, piece_time), time.perf_counter())
+            self.jumps += 1
+
+    def set_rate(self, rate : float) -> float:
+        """
+        Change the playback rate without moving the current piece time.
+        @param rate: float - The new rate, clamped between MIN_RATE and MAX_RATE
+        @return The rate that was applied
+        """
+        with self.lock:
+            wall_time = time.perf_counter()
+            self.reanchor(self.get_raw_time(wall_time), wall_time)
+            self.rate = self.clamp_rate(rate)
+            return self.rate
+
+    def set_loop(self, loop_start : float, loop_end : float) -> bool:
+        """
+        Loop the piece between two points, jumping to the loop start if the current time is outside of it.
+        @param loop_start: float - The A point in piece time
+        @param loop_end: float - The B point in piece time
+        @return True if the loop was set
+        """
+        if loop_end <= loop_start or loop_start < 0:
+            return False
+
+        with self.lock:
+            wall_time = time.perf_counter()
+            piece_time = self.get_raw_time(wall_time)
+
+            self.loop = (loop_start, loop_end)
+            if loop_start <= piece_time < loop_end:
+                self.reanchor(piece_time, wall_time)
+            else:
+                self.reanchor(loop_start, wall_time)
+                self.jumps += 1
+            return True
+
+    def clear_loop(self) -> None:
+        with self.lock:
+            self.loop = None
+            self.bump()
+
+    def wake(self) -> None:
+        # Wake anything waiting on the clock without changing it, like a playback thread that has been told to stop
+        with self.lock:
+            self.bump()
+
+    def wait_for_change(self, version : int, timeout : float) -> bool:
+        """
+        Block until the clock changes from the given version, or the timeout runs out.
+        @param version: int - The version the caller planned its wait with
+        @param timeout: float - The longest to wait in seconds
+        @return True if the clock changed
+        """
+        with self.lock:
+            return self.changed.wait_for(lambda: self.version != version, timeout)
+
+    def get_wall_time(self, piece_time : float) -> float:
+        # The perf_counter time the current segment reaches a piece time at, ignoring any loop wrap in between
+        with self.lock:
+            return self.anchor_wall + (piece_time - self.anchor_piece) / self.rate
+
+    def get_wait(self, piece_time : float) -> float:
+        """
+        Get how much wall time is left until the clock reaches a piece time, or until the loop wraps if that comes first.
+        @param piece_time: float - The piece time to wait for
+        @return The wall time to wait in seconds, zero or less once it has been reached
+        """
+        with self.lock:
+            current = self.get_time(time.perf_counter())
+            target = piece_time
+
+            if self.loop is not None and self.loop[1] < target:
+                target = self.loop[1]
+
+            return (target - current) / self.rate
+
+class VirtualClock:
+    def __init__(self, piece_time : float = 0.0) -> None:
+        """
+        A clock that only moves when told to, for rendering frames at exact timestamps instead of in real time.
+        @param piece_time: float - The piece time to start at
+        @return None
+        """
+        self.piece_time : float = piece_time
+
+    def now(self) -> float:
+        return self.piece_time
+
+    def set_time(self, piece_time : float) -> None:
+        self.piece_time = piece_time
@@ -0,0 +1,77 @@
+import numpy, pygame
+
+from modules.Shapes import Square
+
+# Lowest and highest MIDI pitch of the common keyboard sizes
+KEY_RANGES = {
+    61: (36, 96), # C2 - C7
+    76: (28, 103), # E1 - G7
+    88: (21, 108), # A0 - C8
+}
+
+BLACK_PITCH_CLASSES = (1, 3, 6, 8, 10)
+
+class KeyboardLayout:
+    def __init__(self, key_count : int = 88, screen_width : float = 1280, key_y : float = 600, white_height : float = 120, black_height : float = 80) -> None:
+        """
+        Precompute the geometry of every MIDI pitch 0-127 in flat arrays, so the hot path turns a pitch into a key with one index.
+        @param key_count: int - 61, 76 or 88 keys
+        @param screen_width: float - The width the white keys are spread across
+        @param key_y: float - The top of the keys
+        @param white_height: float - The height of the white keys
+        @param black_height: float - The height of the black keys
+        @return None
+        """
+        if key_count not in KEY_RANGES:
+            raise ValueError(f'Unsupported keyboard size: {key_count}, expected one of {tuple(KEY_RANGES)}')
+
+        self.key_count : int = key_count
+        self.lowest_pitch, self.highest_pitch = KEY_RANGES[key_count]
+
+        self.key_y : float = key_y
+        self.white_height : float = white_height
+        self.black_height : float = black_height
+
+        pitches = numpy.arange(128)
+        on_keyboard = (pitches >= self.lowest_pitch) & (pitches <= self.highest_pitch)
+
+        self.is_black : numpy.ndarray = numpy.isin(pitches % 12, BLACK_PITCH_CLASSES)
+        self.key_index : numpy.ndarray = numpy.where(on_keyboard, pitches - self.lowest_pitch, -1).astype(numpy.int16)
+
+        white_count = int((on_keyboard & ~self.is_black).sum())
+        self.white_spacing : float = screen_width / white_count
+        self.white_width : float = self.white_spacing - max(1.0, self.white_spacing * 0.04)
+        self.black_width : float = self.white_spacing * 0.5
+
+        # A white key sits at its own slot, a black key is centred on the boundary before the next white slot
+        whites_before = numpy.cumsum(on_keyboard & ~self.is_black) - (on_keyboard & ~self.is_black)
+        self.x : numpy.ndarray = numpy.where(self.is_black, whites_before * self.white_spacing - self.black_width / 2, whites_before * self.white_spacing)
+        self.width : numpy.ndarray = numpy.where(self.is_black, self.black_width, self.white_width)
+
+        self.x[~on_keyboard] = numpy.nan
+        self.width[~on_keyboard] = numpy.nan
+
+        self.shapes : list = [None] * 128
+
+    def has_key(self, pitch : int) -> bool:
+        return 0 <= pitch < 128 and self.key_index[pitch] >= 0
+
+    def build_shapes(self, white_colour, black_colour) -> list:
+        """
+        Create a Square for every key and store it against its pitch.
+        @param white_colour - The colour of the white keys
+        @param black_colour - The colour of the black keys
+        @return The list of shapes, white keys first so the black keys are drawn on top
+        """
+        white_keys, black_keys = [], []
+        for pitch in range(self.lowest_pitch, self.highest_pitch + 1):
+            if self.is_black[pitch]:
+                shape = Square(pygame.Vector2(self.x[pitch], self.key_y), (self.black_width, self.black_height), black_colour)
+                black_keys.append(shape)
+            else:
+                shape = Square(pygame.Vector2(self.x[pitch], self.key_y), (self.white_width, self.white_height), white_colour)
+                white_keys.append(shape)
+
+            self.shapes[pitch] = shape
+
+        return white_keys + black_keys
@@ -0,0 +1,114 @@
+import time, json, itertools, pygame, numpy
+from collections import deque
+
+# Each segment is measured between two stages of an input event's trip to the screen
+SEGMENTS = {
+    'input_to_update': ('input', 'update'),
+    'update_to_applied': ('update', 'applied'),
+    'applied_to_flip': ('applied', 'flip'),
+    'input_to_flip': ('input', 'flip'),
+}
+
+HISTOGRAM_EDGES_MS = [0, 1, 2, 4, 8, 16, 32, 64, 128, float('inf')]
+
+class LatencyTracker:
+    def __init__(self, max_samples : int = 4096) -> None:
+        """
+        Follow input events from the moment they arrive until the first flipped frame that shows them.
+        Events get a token at input, the token rides along with the render command and is closed by the flip.
+        @param max_samples: int - How many of the most recent events the statistics are computed over
+        @return None
+        """
+        self.tokens = itertools.count()
+        self.pending = {} # -> token -> {stage: perf_counter}
+        self.samples = {segment: deque(maxlen=max_samples) for segment in SEGMENTS}
+
+    def begin(self, timestamp : float = None) -> int:
+        token = next(self.tokens)
+        self.pending[token] = {'input': time.perf_counter() if timestamp is None else timestamp}
+        return token
+
+    def mark(self, token : int, stage : str, timestamp : float = None) -> None:
+        stages = self.pending.get(token)
+        if stages is not None and stage not in stages:
+            stages[stage] = time.perf_counter() if timestamp is None else timestamp
+
+    def finish(self, tokens : list, timestamp : float = None) -> None:
+        """
+        Close the given tokens at the flip that first put them on screen.
+        @param tokens: list - The tokens whose render commands were applied before the flip
+        @param timestamp: float - When the flip returned
+        @return None
+        """
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        for token in tokens:
+            stages = self.pending.pop(token, None)
+            if stages is None:
+                continue
+
+            stages['flip'] = timestamp
+            for segment, (start, end) in SEGMENTS.items():
+                if start in stages and end in stages:
+                    self.samples[segment].append((stages[end] - stages[start]) * 1000)
+
+    def get_stats(self) -> dict:
+        """
+        Summarise every segment as percentiles and a histogram in milliseconds.
+        @return A dictionary keyed by segment name
+        """
+        stats = {}
+        for segment, samples in self.samples.items():
+            values = numpy.fromiter(samples, numpy.float64, len(samples))
+            if not len(values):
+                stats[segment] = {'count': 0}
+                continue
+
+            p50, p95, p99 = numpy.percentile(values, (50, 95, 99))
+            counts, _ = numpy.histogram(values, HISTOGRAM_EDGES_MS)
+            stats[segment] = {
+                'count': len(values),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(values.max()),
+                'histogram_ms': {f'{HISTOGRAM_EDGES_MS[i]}-{HISTOGRAM_EDGES_MS[i + 1]}': int(count) for i, count in enumerate(counts)},
+            }
+        return stats
+
+    def dump_json(self, path : str) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.get_stats(), file, indent=4)
+
+class LatencyOverlay:
+    def __init__(self, tracker : LatencyTracker, position = (10, 10), refresh_interval : float = 0.25) -> None:
+        """
+        An animator drawing the input to flip latency in the corner, the text is only re-rendered a few times a second.
+        @param tracker: LatencyTracker - The tracker to show
+        @param position - Where to draw the text
+        @param refresh_interval: float - Seconds between re-rendering the text
+        @return None
+        """
+        self.tracker : LatencyTracker = tracker
+        self.position = position
+        self.refresh_interval : float = refresh_interval
+
+        self.font = None
+        self.text = None
+        self.last_refresh : float = 0.0
+
+    def draw(self, surface) -> list:
+        now = time.perf_counter()
+        if self.text is None or now - self.last_refresh >= self.refresh_interval:
+            if self.font is None:
+                self.font = pygame.font.SysFont(None, 20)
+
+            stats = self.tracker.get_stats()['input_to_flip']
+            if stats['count']:
+                line = f"MIDI -> screen  p50 {stats['p50_ms']:.1f}ms  p95 {stats['p95_ms']:.1f}ms  p99 {stats['p99_ms']:.1f}ms  ({stats['count']} events)"
+            else:
+                line = 'MIDI -> screen  waiting for input'
+
+            self.text = self.font.render(line, True, (200, 200, 200))
+            self.last_refresh = now
+
+        return [surface.blit(self.text, self.position)]
@@ -1,21 +1,28 @@
-import os, mido, pretty_midi
-from mido import MidiFile
-from pretty_midi import pretty_midi
-from pygame import midi
+import os, time, numpy, heapq, queue, struct, threading
+from collections import deque
+from threading import Thread
 
-import rtmidi, time
-from rtmidi.midiconstants import NOTE_ON, NOTE_OFF
-
-from modules.Piano import *
+from modules.PianoObjects import *
+from modules.MidiCache import MidiCache
+from modules.Profiler import profiler
+from modules.Startup import init_pygame_midi
 from modules.Output import *
-from pretty_midi import *
+
+# pretty_midi, mido, rtmidi, pygame.midi and asyncio are imported where they are used, so a mode only pays for the backends it needs
+NOTE_ON, NOTE_OFF = 0x90, 0x80
+CONTROL_CHANGE = 0xB0
+META_SET_TEMPO, META_END_OF_TRACK = 0x51, 0x2F
+SET_TEMPO = 0xFF # -> The status stream_midi's track readers give a tempo change, no channel message uses it
+SYSTEM_MESSAGE_LENGTHS = {0xF1: 1, 0xF2: 2, 0xF3: 1} # -> Data bytes after the status, the rest carry none
 
 class MidiParser:
-    def __init__(self) -> None:
+    def __init__(self, cache : MidiCache = None) -> None:
         self.result = {}
+        self.cache : MidiCache = cache
     
     def midi_note_number_to_name(self, note_number) -> str:
         notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+        note_number = int(note_number) # note table pitches are uint8, which would wrap below octave 0
         octave = (note_number // 12) - 2
 
         note_index = note_number % 12
@@ -28,30 +35,270 @@ class MidiParser:
 
         return key_name.replace("-1", "")
     
-    def get_midi_length(self, result: dict) -> int: 
-        if not result:
+    def get_midi_length(self, result) -> int: 
+        if len(result) <= 0:
             error('Couldnt get the MIDI length due to the file not being deserialized.')
             return -1
         
+        if isinstance(result, numpy.ndarray):
+            return float(result.start[-1]) # note tables are sorted by start
+        
         return max(result.keys())
     
     def get_note_range(self, note_array): #Get the smallest and lowest note start time
         if len(note_array) <= 0:
             return 0, 0
         
+        if isinstance(note_array, numpy.ndarray):
+            return float(note_array.end.max()), float(note_array.start.min())
+        
         return max(note.end for note in note_array), min(note.start for note in note_array)
     
-    def deserialize_midi(self, midi_file) -> dict:
+    def split_by_instruments(self, note_table : numpy.ndarray) -> dict:
+        """
+        Split a note table into one table per instrument, each still sorted by start time.
+        @param note_table - the note table to split
+        @return a dictionary where keys are instrument indices and values are note tables
+        """
+        order = numpy.argsort(note_table.instrument_index, kind='stable')
+        ordered = note_table[order]
+
+        instruments, offsets = numpy.unique(ordered.instrument_index, return_index=True)
+        return dict(zip(instruments.tolist(), numpy.split(ordered, offsets[1:])))
+    
+    def build_note_table(self, f_midi_file : 'pretty_midi.PrettyMIDI') -> numpy.recarray:
+        """
+        Build a columnar note table from a parsed file, sorted by start time, without keeping any per-note objects around.
+        @param f_midi_file - the PrettyMIDI file to read the notes from
+        @return a numpy.recarray with the NOTE_DTYPE fields
+        """
+        controls = [[change for change in instrument.control_changes if change.number in PARSED_CONTROLLERS] for instrument in f_midi_file.instruments]
+        table = empty_note_table(sum(len(instrument.notes) for instrument in f_midi_file.instruments) + sum(len(changes) for changes in controls))
+        
+        offset = 0
+        for instrument_index, instrument in enumerate(f_midi_file.instruments):
+            count = len(instrument.notes)
+            chunk = table[offset:offset + count]
+
+            chunk.start = numpy.fromiter((note.start for note in instrument.notes), numpy.float64, count)
+            chunk.end = numpy.fromiter((note.end for note in instrument.notes), numpy.float64, count)
+            chunk.pitch = numpy.fromiter((note.pitch for note in instrument.notes), numpy.uint8, count)
+            chunk.velocity = numpy.fromiter((note.velocity for note in instrument.notes), numpy.uint8, count)
+            chunk.instrument_index = instrument_index
+
+            offset += count
+
+            # The pedal rows go in the same table, so they come out of the scheduler in time order with the notes
+            changes = controls[instrument_index]
+            count = len(changes)
+            chunk = table[offset:offset + count]
+
+            chunk.start = numpy.fromiter((change.time for change in changes), numpy.float64, count)
+            chunk.end = chunk.start
+            chunk.pitch = numpy.fromiter((change.number for change in changes), numpy.uint8, count)
+            chunk.velocity = numpy.fromiter((change.value for change in changes), numpy.uint8, count)
+            chunk.instrument_index = instrument_index
+            chunk.pedal = 1
+
+            offset += count
+
+        return table[numpy.argsort(table.start, kind='stable')]
+    
+    def read_variable_length(self, data, position : int) -> tuple:
+        value = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value = (value << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                return value, position
+
+    def find_tracks(self, data) -> tuple:
+        """
+        Read the header chunk and find where each track's events sit, without reading the events themselves.
+        @param data - The whole file, as bytes or a memory map
+        @return A tuple of the ticks per beat and a list of (start, end) byte offsets, one per MTrk chunk
+        """
+        if data[:4] != b'MThd':
+            raise ValueError('no MThd header at the start of the file')
+
+        header_length, _, _, ticks_per_beat = struct.unpack('>IHHH', data[4:14])
+        if ticks_per_beat & 0x8000:
+            raise ValueError('SMPTE time division is not supported')
+
+        tracks, position = [], 8 + header_length
+        while position + 8 <= len(data):
+            name, length = data[position:position + 4], struct.unpack('>I', data[position + 4:position + 8])[0]
+            position += 8
+            if name == b'MTrk':
+                tracks.append((position, min(position + length, len(data))))
+            position += length
+
+        return ticks_per_beat, tracks
+
+    def read_track_events(self, data, position : int, end : int, track_index : int):
+        """
+        Decode one track's events as they are asked for, yielding only the ones stream_midi plays.
+        Meta events don't change the running status, SysEx clears it.
+        @param data - The whole file, as bytes or a memory map
+        @param position: int - Where the track's events start
+        @param end: int - Where the track's chunk ends
+        @param track_index: int - Passed through so the merged events remember their track
+        @return a generator of (tick, track index, status, data1, data2), where a tempo change has status SET_TEMPO and the tempo in data1
+        """
+        tick, running_status = 0, None
+        try:
+            while position < end:
+                byte = data[position]
+                position += 1
+                delta = byte & 0x7F
+                while byte >= 0x80:
+                    byte = data[position]
+                    position += 1
+                    delta = (delta << 7) | (byte & 0x7F)
+                tick += delta
+
+                status = data[position]
+                if status < 0x80:
+                    if running_status is None:
+                        error(f'Track {track_index} uses running status before any status byte, the rest of it was skipped.')
+                        return
+                    status = running_status
+                else:
+                    position += 1
+
+                if status == 0xFF:
+                    kind = data[position]
+                    length, position = self.read_variable_length(data, position + 1)
+                    if kind == META_END_OF_TRACK:
+                        return
+                    if kind == META_SET_TEMPO and length == 3:
+                        yield tick, track_index, SET_TEMPO, int.from_bytes(data[position:position + 3], 'big'), 0
+                    position += length
+                    continue
+
+                if status == 0xF0 or status == 0xF7:
+                    length, position = self.read_variable_length(data, position)
+                    position += length
+                    running_status = None
+                    continue
+
+                if status >= 0xF0:
+                    position += SYSTEM_MESSAGE_LENGTHS.get(status, 0) # -> Not expected in a file, but their length is fixed so they can be stepped over
+                    continue
+
+                running_status = status
+                kind = status & 0xF0
+                if kind == 0xC0 or kind == 0xD0:
+                    position += 1
+                    continue
+
+                data1, data2 = data[position], data[position + 1]
+                position += 2
+                if kind == NOTE_ON or kind == NOTE_OFF or (kind == CONTROL_CHANGE and data1 in PARSED_CONTROLLERS):
+                    yield tick, track_index, status, data1, data2
+        except IndexError:
+            error(f'Track {track_index} ends part way through an event, the rest of it was skipped.')
+
+    def stream_midi(self, midi_file):
+        """
+        Read a MIDI file and yield its notes in start order, decoding each track's events only as the merge reaches them.
+        The file is memory-mapped and nothing is parsed up front, so the first note comes out as soon as every track's first event has been read.
+        A note is only yielded once it and every note that started before it have their note-off, since the scheduler needs the end
+        when the note is pressed. Memory therefore follows how many notes start while the oldest one is still held: the polyphony for
+        ordinary playing, but a note held for a long time, like a drone, keeps every note that starts after it until it ends.
+        @param midi_file - the path of the MIDI file
+        @return a generator of N_Note objects sorted by start time
+        """
+        if ".mid" not in midi_file:
+            error(f'The requested file: {midi_file} is not a MIDI file.')
+            return
+
+        if os.path.getsize(midi_file) == 0:
+            error(f'The requested file: {midi_file} is empty.')
+            return
+
+        import mmap
+        with open(midi_file, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                ticks_per_beat, tracks = self.find_tracks(data)
+            except (ValueError, struct.error) as exception:
+                error(f'Could not read {midi_file}: {exception}')
+                return
+
+            merged = heapq.merge(*(self.read_track_events(data, start, end, index) for index, (start, end) in enumerate(tracks)), key=lambda event: event[0])
+
+            tempo = 500000
+            last_tick, seconds = 0, 0.0
+
+            instruments = {} # (track, channel) -> instrument index, assigned in the order they first play
+            held = {} # (instrument index, pitch) -> notes still waiting for their note-off
+            pending = deque() # notes in start order, yielded once the oldest one has an end
+
+            for tick, track_index, status, data1, data2 in merged:
+                seconds += (tick - last_tick) * (tempo * 1e-6 / ticks_per_beat) # -> Grouped like mido.tick2second, so the times match it exactly
+                last_tick = tick
+
+                if status == SET_TEMPO:
+                    tempo = data1
+                    continue
+
+                kind = status & 0xF0
+                instrument_index = instruments.setdefault((track_index, status & 0x0F), len(instruments))
+
+                if kind == CONTROL_CHANGE:
+                    pending.append(N_Note(seconds, seconds, data1, data2, instrument_index, True))
+                    continue
+
+                key = (instrument_index, data1)
+
+                if kind == NOTE_ON and data2 > 0:
+                    note = N_Note(seconds, None, data1, data2, instrument_index)
+                    held.setdefault(key, deque()).append(note)
+                    pending.append(note)
+                    continue
+
+                if held.get(key):
+                    held[key].popleft().end = seconds
+
+                while pending and pending[0].end is not None:
+                    yield pending.popleft()
+
+            for note in pending:
+                if note.end is None:
+                    note.end = seconds
+                yield note
+
+    def deserialize_midi(self, midi_file, as_table : bool = False):
         warn(f"Deserializing: {midi_file}, please wait.")
 
         if ".mid" not in midi_file:
             error(f'The requested file: {midi_file} is not a MIDI file.')
-            return {}
+            return empty_note_table() if as_table else {}
         
         self.result = {}
 
-        f_midi_file : PrettyMIDI = PrettyMIDI(midi_file)
-        print(f_midi_file.key_signature_changes)
+        if as_table and self.cache is not None:
+            cached = self.cache.load(midi_file)
+            if cached is not None:
+                warn(f'Loaded {len(cached)} notes from the MIDI cache.')
+                self.result = cached
+                return self.result
+
+        import pretty_midi
+        with profiler.span('parse_midi'):
+            f_midi_file : pretty_midi.PrettyMIDI = pretty_midi.PrettyMIDI(midi_file)
+        debug(f'Key signature changes: {f_midi_file.key_signature_changes}')
+
+        if as_table:
+            with profiler.span('build_note_table'):
+                self.result = self.build_note_table(f_midi_file)
+            if self.cache is not None:
+                self.cache.store(midi_file, self.result)
+
+            warn(f'Found {len(f_midi_file.instruments)} instruments and {len(self.result)} notes ({self.result.nbytes // 1024} KB)!')
+            return self.result
+
         instrument_index : int = 0
         
         for instrument in f_midi_file.instruments:
@@ -61,13 +308,13 @@ class MidiParser:
                     self.result[n_note.start] = []    
                 self.result[n_note.start].append(n_note)
             
-            # Pedal implmentation, will work on it later cause i fucked it this time TODO: basically make a new dict of pedal, and will just make a seperate player and thread for the pedal alone. {0.0: PEDAL_OBJECT, 1.2341: PEDAL_OBJECT} [time : pedal_object]
-            #for control_change in instrument.control_changes:
-            #    if type(control_change) is pretty_midi.ControlChange and control_change.number == 64:
-            #        control_change = N_Note(control_change.time, control_change.time, control_change.number, control_change.value, instrument_index, control_change.value == 127) 
-            #        if control_change.start not in self.result:
-            #            self.result[control_change.start] = []    
-            #        self.result[control_change.start].append(control_change)
+            # The pedal goes in the same dictionary as the notes, the scheduler keeps track of it so no extra player thread is needed
+            for control_change in instrument.control_changes:
+                if control_change.number in PARSED_CONTROLLERS:
+                    control_change = N_Note(control_change.time, control_change.time, control_change.number, control_change.value, instrument_index, True)
+                    if control_change.start not in self.result:
+                        self.result[control_change.start] = []
+                    self.result[control_change.start].append(control_change)
                 
             instrument_index += 1
 
@@ -77,18 +324,115 @@ class MidiParser:
 
         return self.result
     
+class LoopbackMidiInput:
+    def __init__(self) -> None:
+        """
+        A stand-in for rtmidi.MidiIn, whatever is passed to send_message comes straight back out of the callback like it came from a keyboard.
+        @return None
+        """
+        self.callback = None
+        self.data = None
+
+    def set_callback(self, callback, data = None) -> None:
+        self.callback, self.data = callback, data
+
+    def cancel_callback(self) -> None:
+        self.callback = None
+
+    def send_message(self, message, delta : float = 0.0) -> None:
+        if self.callback is not None:
+            self.callback((list(message), delta), self.data)
+
+    def close_port(self) -> None:
+        self.cancel_callback()
+
 class MIDIListener:
     def __init__(self):
         self.running = True
         self.input_midi_device = None
+        self.POLL_INTERVAL = 0.001
+
+        self.midi_in = None # -> rtmidi.MidiIn or LoopbackMidiInput, used by events()
+        self.event_loop = None
+        self.event_queue = None
+        self.recorder = None # -> A MidiSerializer every incoming message is copied into, if set
 
-        midi.init()
+    def get_all_input_ports(self) -> list:
+        import rtmidi
+        return rtmidi.MidiIn().get_ports()
+
+    def open_input(self, port : int = 0, virtual_name : str = None):
+        """
+        Open an rtmidi input for events(), without asking on the console.
+        @param port: int - The index of the input port
+        @param virtual_name: str - Open a virtual port with this name instead, other programs can then send to it
+        @return The opened rtmidi.MidiIn
+        """
+        import rtmidi
+        self.midi_in = rtmidi.MidiIn()
+        if virtual_name is not None:
+            self.midi_in.open_virtual_port(virtual_name)
+        else:
+            self.midi_in.open_port(port)
+        return self.midi_in
+
+    def open_loopback(self) -> LoopbackMidiInput:
+        self.midi_in = LoopbackMidiInput()
+        return self.midi_in
+
+    def on_midi_message(self, message, data = None) -> None:
+        # Runs on rtmidi's own thread, so only stamp the event and hand it over to the event loop
+        timestamp = time.perf_counter()
+        if self.recorder is not None:
+            self.recorder.record(message[0], timestamp)
+
+        event = MidiEvent(message[0], timestamp)
+        self.event_loop.call_soon_threadsafe(self.event_queue.put_nowait, event)
+
+    async def events(self, batch_size : int = 1):
+        """
+        Yield the incoming MIDI events as they arrive, nothing is polled so the loop sleeps until the next message.
+        @param batch_size: int - Above 1, yield lists of up to this many events holding whatever has already queued up
+        @return An async generator of MidiEvent objects, or lists of them when batching
+        """
+        if self.midi_in is None:
+            error('No MIDI input is open, call open_input or open_loopback first.')
+            return
+
+        import asyncio
+        self.event_loop = asyncio.get_running_loop()
+        self.event_queue = asyncio.Queue()
+        self.midi_in.set_callback(self.on_midi_message)
+
+        try:
+            while self.running:
+                event = await self.event_queue.get()
+                if event is None:
+                    break
+
+                if batch_size <= 1:
+                    yield event
+                    continue
+
+                batch = [event]
+                while len(batch) < batch_size and not self.event_queue.empty():
+                    queued = self.event_queue.get_nowait()
+                    if queued is None:
+                        self.running = False
+                        break
+                    batch.append(queued)
+                yield batch
+        finally:
+            self.midi_in.cancel_callback()
 
     def get_all_midi_devices(self):
+        from pygame import midi
+        init_pygame_midi()
         return [midi.get_device_info(n) for n in range(midi.get_count())]
     
-    def ask_for_input(self) -> midi.Input:
+    def ask_for_input(self) -> 'pygame.midi.Input':
         devices = self.get_all_midi_devices()
+        flush() # so queued log lines do not end up in the middle of the prompt
         
         print("Available MIDI Devices:")
         for index, device in enumerate(devices):
@@ -105,40 +449,302 @@ class MIDIListener:
         chosen_device_name = chosen_device[1].decode()        
         print(f"Device '{chosen_device_name}' has been chosen!")
         
+        from pygame import midi
         self.input_midi_device = midi.Input(device_id)
         return self.input_midi_device
 
     def exit(self) -> None:
         self.running = False
+        if self.event_loop is not None:
+            try:
+                self.event_loop.call_soon_threadsafe(self.event_queue.put_nowait, None) # wakes up events() so it can finish
+            except RuntimeError:
+                pass # -> The loop has already closed, so events() is done
         
     def listen(self):
         while self.running:
             if self.input_midi_device.poll():
                 midi_events = self.input_midi_device.read(25)
                 yield midi_events
+            else:
+                time.sleep(self.POLL_INTERVAL)
 
 class MidiSynthesiser:
     def __init__(self) -> None:
-        self.midi_out = rtmidi.MidiOut()
+        self.output = None # -> The rtmidi.MidiOut, created the first time it is needed
         self.port_open : bool = False
 
         self.pedal : bool = False
 
+        self.MAX_QUEUED = 4096 # -> Producers block once this many messages are waiting, that is the back-pressure
+        self.COALESCE_WINDOW = 0.001 # -> Messages due within this long of each other go out in one batch
+
+        self.output_queue = queue.Queue(maxsize=self.MAX_QUEUED)
+        self.sender_thread = None
+
+        self.send_lag = deque(maxlen=4096)
+        self.batches_sent : int = 0
+        self.messages_sent : int = 0
+        self.blocked_puts : int = 0
+        self.failed_messages : int = 0
+
+    @property
+    def midi_out(self):
+        if self.output is None:
+            import rtmidi
+            self.output = rtmidi.MidiOut()
+        return self.output
+
+    @midi_out.setter
+    def midi_out(self, midi_out) -> None:
+        self.output = midi_out
+
     def get_all_ports(self):
         return self.midi_out.get_ports()
 
     def open_port(self, port = 0) -> bool:
         if not self.port_open:
             self.port_open = self.midi_out.open_port(port)
+
+        if self.port_open and self.sender_thread is None:
+            self.sender_thread = Thread(target=self.sender_loop, name='MidiSender', daemon=True)
+            self.sender_thread.start()
         
         return self.port_open
+
+    def close(self) -> None:
+        if self.sender_thread is not None:
+            self.output_queue.put(None)
+            self.sender_thread.join()
+            self.sender_thread = None
+
+    def queue_message(self, message : list, scheduled : float = None) -> None:
+        """
+        Hand a message to the sender thread, blocking while the queue is full.
+        @param message: list - The MIDI bytes
+        @param scheduled: float - The perf_counter time the message should go out at, now if not given
+        @return None
+        """
+        item = (time.perf_counter() if scheduled is None else scheduled, message)
+        if self.sender_thread is None:
+            self.send_batch([item]) # no sender yet, so send it from here like before
+            return
+
+        try:
+            self.output_queue.put_nowait(item)
+        except queue.Full:
+            self.blocked_puts += 1
+            self.output_queue.put(item)
+
+    def sender_loop(self) -> None:
+        held, closing = None, False
+        while not closing:
+            first = held if held is not None else self.output_queue.get()
+            held = None
+            if first is None:
+                return
+
+            # Everything already queued and due alongside the first message is sent in the same wake up
+            batch = [first]
+            while True:
+                try:
+                    item = self.output_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    closing = True
+                    break
+
+                if item[0] - first[0] > self.COALESCE_WINDOW:
+                    held = item
+                    break
+                batch.append(item)
+
+            time_to_wait = first[0] - time.perf_counter()
+            if time_to_wait > 0:
+                time.sleep(time_to_wait)
+
+            self.send_batch(batch)
+
+    def send_batch(self, batch : list) -> None:
+        # One send_message per message, rtmidi rejects anything over 3 bytes that is not SysEx so a batch can't be packed into one buffer
+        for _, message in batch:
+            try:
+                self.midi_out.send_message(message)
+            except Exception as exception:
+                # Logged and skipped, if the sender thread died every producer would block on the full queue
+                self.failed_messages += 1
+                error(f'Failed to send the MIDI message {message}: {exception}')
+
+        sent = time.perf_counter()
+        for scheduled, _ in batch:
+            self.send_lag.append(sent - float(scheduled))
+
+        self.batches_sent += 1
+        self.messages_sent += len(batch)
+
+    def get_send_stats(self) -> dict:
+        """
+        Summarise how far behind their scheduled time the messages went out.
+        @return A dictionary with the message and batch counts and the mean, p95 and max lag in milliseconds
+        """
+        lag = sorted(self.send_lag)
+        if not lag:
+            return {'messages': self.messages_sent, 'batches': self.batches_sent, 'blocked_puts': self.blocked_puts, 'failed_messages': self.failed_messages, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+
+        return {
+            'messages': self.messages_sent,
+            'batches': self.batches_sent,
+            'blocked_puts': self.blocked_puts,
+            'failed_messages': self.failed_messages,
+            'mean_ms': sum(lag) / len(lag) * 1000,
+            'p95_ms': lag[min(len(lag) - 1, int(len(lag) * 0.95))] * 1000,
+            'max_ms': lag[-1] * 1000,
+        }
     
-    def play_note(self, note, velocity) -> None:
-        self.midi_out.send_message([NOTE_ON, note, velocity])
+    def play_note(self, note, velocity, scheduled : float = None) -> None:
+        self.queue_message([NOTE_ON, int(note), int(velocity)], scheduled)
 
-    def stop_note(self, note, velocity = 0) -> None: 
-        self.midi_out.send_message([NOTE_OFF, note, velocity])
+    def stop_note(self, note, velocity = 0, scheduled : float = None) -> None: 
+        self.queue_message([NOTE_OFF, int(note), int(velocity)], scheduled)
       
 class MidiSerializer:
-    def __init__(self) -> None:
-        pass
\ No newline at end of file
+    def __init__(self, capacity : int = 65536, ticks_per_beat : int = 480, tempo : int = 500000) -> None:
+        """
+        Record live MIDI input to a Standard MIDI File. The input thread only copies the bytes into a preallocated ring buffer,
+        a writer thread drains it and appends the track data to the file as it goes, so memory stays flat however long the session is.
+        @param capacity: int - How many events the ring buffer holds before new ones are dropped
+        @param ticks_per_beat: int - The resolution of the written file
+        @param tempo: int - Microseconds per beat of the written file, only used to turn seconds into ticks
+        @return None
+        """
+        self.capacity : int = capacity
+        self.ticks_per_beat : int = ticks_per_beat
+        self.tempo : int = tempo
+        self.DRAIN_INTERVAL = 0.1
+
+        self.status : numpy.ndarray = numpy.zeros(capacity, numpy.uint8)
+        self.data1 : numpy.ndarray = numpy.zeros(capacity, numpy.uint8)
+        self.data2 : numpy.ndarray = numpy.zeros(capacity, numpy.uint8)
+        self.timestamps : numpy.ndarray = numpy.zeros(capacity, numpy.float64)
+
+        # Only the input thread moves write_index and only the writer thread moves read_index
+        self.write_index : int = 0
+        self.read_index : int = 0
+        self.dropped : int = 0
+
+        self.file = None
+        self.track_length : int = 0
+        self.first_timestamp : float = None
+        self.last_tick : int = 0
+
+        self.writer_thread = None
+        self.stopping = threading.Event()
+
+    def start(self, path : str) -> None:
+        """
+        Open the file and start the writer thread.
+        @param path: str - Where to write the .mid file
+        @return None
+        """
+        if self.writer_thread is not None:
+            error('The recorder is already running.')
+            return
+
+        self.file = open(path, 'wb')
+        self.file.write(b'MThd' + struct.pack('>IHHH', 6, 0, 1, self.ticks_per_beat))
+        self.file.write(b'MTrk' + struct.pack('>I', 0)) # -> The length is patched in by stop, once it is known
+
+        import mido
+        self.track_length, self.first_timestamp, self.last_tick = 0, None, 0
+        self.write_track_data(b'\x00' + bytes(mido.MetaMessage('set_tempo', tempo=self.tempo).bytes()))
+
+        self.stopping.clear()
+        self.writer_thread = Thread(target=self.writer_loop, name='MidiRecorder', daemon=True)
+        self.writer_thread.start()
+
+    def record(self, message, timestamp : float) -> None:
+        """
+        Copy a channel message into the ring buffer, called straight from the input callback.
+        @param message - The MIDI bytes
+        @param timestamp: float - The perf_counter time the message arrived at
+        @return None
+        """
+        if message[0] >= 0xF0:
+            return # sysex and real time messages are not recorded
+
+        if self.write_index - self.read_index >= self.capacity:
+            self.dropped += 1
+            return
+
+        slot = self.write_index % self.capacity
+        self.status[slot] = message[0]
+        self.data1[slot] = message[1] if len(message) > 1 else 0
+        self.data2[slot] = message[2] if len(message) > 2 else 0
+        self.timestamps[slot] = timestamp
+        self.write_index += 1 # published last, so the writer never sees a half written slot
+
+    def writer_loop(self) -> None:
+        while not self.stopping.wait(self.DRAIN_INTERVAL):
+            self.drain()
+        self.drain()
+
+    def drain(self) -> None:
+        end = self.write_index
+        if end == self.read_index:
+            return
+
+        import mido
+        slots = numpy.arange(self.read_index, end) % self.capacity
+        events = zip(self.status[slots].tolist(), self.data1[slots].tolist(), self.data2[slots].tolist(), self.timestamps[slots].tolist())
+        self.read_index = end
+
+        data = bytearray()
+        for status, data1, data2, timestamp in events:
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamp
+
+            tick = round(mido.second2tick(timestamp - self.first_timestamp, self.ticks_per_beat, self.tempo))
+            data += self.encode_variable_length(max(0, tick - self.last_tick))
+            self.last_tick = max(tick, self.last_tick)
+
+            # Program change and channel pressure carry a single data byte
+            data += bytes((status, data1)) if status & 0xF0 in (0xC0, 0xD0) else bytes((status, data1, data2))
+
+        self.write_track_data(data)
+
+    def write_track_data(self, data : bytes) -> None:
+        self.file.write(data)
+        self.file.flush()
+        self.track_length += len(data)
+
+    def encode_variable_length(self, value : int) -> bytes:
+        encoded = [value & 0x7F]
+        value >>= 7
+        while value:
+            encoded.append(0x80 | (value & 0x7F))
+            value >>= 7
+        return bytes(reversed(encoded))
+
+    def stop(self) -> None:
+        """
+        Write out whatever is left, end the track and fix up its length so the file is valid.
+        @return None
+        """
+        if self.writer_thread is None:
+            return
+
+        self.stopping.set()
+        self.writer_thread.join()
+        self.writer_thread = None
+
+        import mido
+        self.write_track_data(b'\x00' + bytes(mido.MetaMessage('end_of_track').bytes()))
+        self.file.seek(18) # -> The track length sits after the 14 byte header chunk and the MTrk tag
+        self.file.write(struct.pack('>I', self.track_length))
+        self.file.close()
+        self.file = None
+
+        if self.dropped:
+            error(f'The recorder dropped {self.dropped} events, the ring buffer was full.')
\ No newline at end of file
@@ -0,0 +1,99 @@
+import os, hashlib, numpy
+
+from modules.Output import *
+from modules.PianoObjects import NOTE_DTYPE
+
+CACHE_VERSION = 2 # -> Bump this whenever NOTE_DTYPE or the way tables are built changes, old entries then just stop matching
+
+class MidiCache:
+    def __init__(self, cache_dir : str = None, max_bytes : int = 256 * 1024 * 1024) -> None:
+        """
+        A directory of pre-parsed note tables keyed by the hash of the MIDI file contents, so an edited file never hits a stale entry.
+        @param cache_dir: str - Where to keep the tables, defaults to ~/.piano-visualiser/cache
+        @param max_bytes: int - The total size the directory is trimmed to, least recently used tables go first
+        @return None
+        """
+        self.cache_dir : str = cache_dir or os.path.join(os.path.expanduser('~'), '.piano-visualiser', 'cache')
+        self.max_bytes : int = max_bytes
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_key(self, midi_file : str) -> str:
+        digest = hashlib.sha1(f'{CACHE_VERSION}:{NOTE_DTYPE.descr}'.encode())
+        with open(midi_file, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_path(self, key : str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npy')
+
+    def load(self, midi_file : str):
+        """
+        Memory-map the cached note table for a MIDI file, if there is one.
+        @param midi_file: str - The path of the MIDI file
+        @return The read-only note table, or None on a miss
+        """
+        try:
+            path = self.get_path(self.get_key(midi_file))
+            if not os.path.exists(path):
+                return None
+
+            table = numpy.load(path, mmap_mode='r')
+            if table.dtype != NOTE_DTYPE:
+                error(f'Ignoring the cached table {path} since it has the wrong layout.')
+                return None
+
+            os.utime(path) # -> The modification time doubles as the last use for the LRU eviction
+            return table.view(numpy.recarray)
+        except (OSError, ValueError) as exception:
+            error(f'Failed to read the MIDI cache for {midi_file}: {exception}')
+            return None
+
+    def store(self, midi_file : str, table : numpy.ndarray) -> None:
+        """
+        Save a parsed note table for a MIDI file and trim the cache back under its size limit.
+        @param midi_file: str - The path of the MIDI file
+        @param table: numpy.ndarray - The note table to save
+        @return None
+        """
+        try:
+            path = self.get_path(self.get_key(midi_file))
+            temporary_path = f'{path}.{os.getpid()}.tmp'
+
+            with open(temporary_path, 'wb') as file:
+                numpy.save(file, numpy.asarray(table, dtype=NOTE_DTYPE))
+            os.replace(temporary_path, path) # -> Atomic, so a reader never maps a half written table
+        except OSError as exception:
+            error(f'Failed to write the MIDI cache for {midi_file}: {exception}')
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used tables until the cache fits in max_bytes.
+        @return None
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as exception:
+                error(f'Failed to evict {path} from the MIDI cache: {exception}')
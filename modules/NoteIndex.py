@@ -0,0 +1,74 @@
+import numpy
+
+from modules.PianoObjects import to_note_table, SustainTimeline
+
+class NoteIndex:
+    def __init__(self, notes) -> None:
+        """
+        An interval index over a piece. The notes are split into length classes that double in size, each sorted by start,
+        so a long note only makes its own class look further back instead of every note after it.
+        @param notes - A note table sorted by start, or a dictionary mapping start times to lists of notes
+        @return None
+        """
+        table : numpy.recarray = notes if isinstance(notes, numpy.ndarray) else to_note_table(notes)
+
+        # Control change rows have no length on screen, they are kept apart for looking up the pedal state
+        is_control = table.pedal != 0
+        if is_control.any():
+            self.controls : numpy.recarray = table[is_control]
+            table = table[~is_control]
+        else:
+            self.controls : numpy.recarray = table[:0]
+        self.sustain_timeline = SustainTimeline(self.controls)
+
+        self.table : numpy.recarray = table
+
+        self.starts : numpy.ndarray = self.table.start
+        self.MIN_CLASS_LENGTH = 0.125 # -> Notes up to this long share the first class
+
+        durations = numpy.maximum(self.table.end - self.starts, self.MIN_CLASS_LENGTH)
+        length_classes = numpy.ceil(numpy.log2(durations / self.MIN_CLASS_LENGTH)).astype(numpy.intp)
+
+        self.classes = [] # -> (longest note in the class, its starts, its rows in the table), the rows stay in start order
+        for length_class in numpy.unique(length_classes).tolist():
+            members = numpy.flatnonzero(length_classes == length_class)
+            self.classes.append((float((self.table.end[members] - self.starts[members]).max()), self.starts[members], members))
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def get_candidates(self, window_start : float, window_end : float) -> numpy.ndarray:
+        # No note in a class is longer than its longest one, so only the ones starting that far before the window can reach into it
+        found = []
+        for longest, starts, members in self.classes:
+            lo = numpy.searchsorted(starts, window_start - longest, 'left')
+            hi = numpy.searchsorted(starts, window_end, 'right')
+            if hi > lo:
+                found.append(members[lo:hi])
+
+        if len(found) == 1:
+            return found[0]
+        return numpy.sort(numpy.concatenate(found)) if found else numpy.empty(0, numpy.intp) # -> Row order is start order
+
+    def query(self, window_start : float, window_end : float) -> numpy.recarray:
+        """
+        Find every note overlapping a time window in O(c log n + k + m), for c length classes and k notes found, where m is the notes
+        that start within their own class's longest length before the window but end before it. A long note only adds to m for its own class.
+        @param window_start: float - The start of the window in piece time
+        @param window_end: float - The end of the window in piece time
+        @return A note table of the notes that start at or before window_end and end after window_start, sorted by start
+        """
+        candidates = self.table[self.get_candidates(window_start, window_end)]
+        return candidates[candidates.end > window_start]
+
+    def sounding(self, piece_time : float) -> numpy.recarray:
+        """
+        Find the notes that are held down at a point in the piece, not counting the ones that start exactly on it.
+        @param piece_time: float - The point in the piece
+        @return A note table of the sounding notes
+        """
+        candidates = self.table[self.get_candidates(piece_time, piece_time)]
+        return candidates[(candidates.end > piece_time) & (candidates.start < piece_time)]
+
+    def sustained_instruments(self, piece_time : float) -> set:
+        return self.sustain_timeline.get_sustained_instruments(piece_time)
@@ -1,37 +1,79 @@
-import random, pygame
+import random, pygame, itertools
 from modules.Shapes import *
 
 class ObjectManager:
     def __init__(self):
-        self.objects = []
-
-    def insert(self, object):
-        self.objects.append(object)
-    
-    def remove_object(self, object):
-        for other_object in self.objects:
-            if other_object.ID == object.ID:
-                self.objects.remove(other_object)
-                return True  
-        return False
-    
+        """
+        A registry of shapes keyed by their handle (Shape.ID), bucketed by draw layer.
+        Insert, remove and lookup are dictionary operations, and walking the layers in order gives the draw order without sorting.
+        @return None
+        """
+        self.handles = {} # -> handle -> object
+        self.layers = [{} for _ in range(LAYER_COUNT)] # -> one handle -> object bucket per layer, lowest drawn first
+
+    @property
+    def objects(self) -> list:
+        return list(self.draw_order())
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def __contains__(self, object) -> bool:
+        return object.ID in self.handles
+
+    def insert(self, object, layer : int = None) -> int:
+        """
+        Add an object to the registry, inserting one that is already registered does nothing.
+        @param object: Shape - The object to add
+        @param layer: int - The layer to draw it in, the object's own layer if not given
+        @return The object's handle
+        """
+        if object.ID in self.handles:
+            return object.ID
+
+        if layer is not None:
+            object.layer = layer
+
+        self.handles[object.ID] = object
+        self.layers[object.layer][object.ID] = object
+        return object.ID
+
+    def remove_object(self, object) -> bool:
+        if self.handles.pop(object.ID, None) is None:
+            return False
+
+        del self.layers[object.layer][object.ID]
+        return True
+
+    def get(self, handle : int):
+        return self.handles.get(handle, None)
+
+    def draw_order(self, first_layer : int = 0):
+        # The layers are already in draw order, and each bucket keeps its insertion order
+        return itertools.chain.from_iterable(layer.values() for layer in self.layers[first_layer:])
+
+    def get_layer(self, layer : int):
+        return self.layers[layer].values()
+
     def objects_to_rect(self, surface):
         rects = []
-        for object in self.objects:
+        for object in self.draw_order():
             shape, radius, colour = object.draw(surface)
             rects.append([shape, radius, colour])
 
         return rects
-     
+
     def populate(self, amount : int, custom_func = None):
         if custom_func != None:
-            self.objects += custom_func()
+            for obj in custom_func():
+                self.insert(obj)
             return
-           
+
         # This is just like a hello world.
         for _ in range(0, amount + 1):
             obj = Square(pygame.Vector2(1280/2 + random.randint(-100, 100),720/2 + random.randint(-100, 100)), 50, (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
             self.insert(obj)
 
     def clear_objects(self):
-        self.objects = []
+        self.handles = {}
+        self.layers = [{} for _ in range(LAYER_COUNT)]
@@ -1,15 +1,200 @@
 import colorama
 import datetime
+import os, time, queue, atexit, threading
 
 colorama.init()
 
+LEVELS = {'debug': 0, 'print': 1, 'warn': 2, 'error': 3}
+
+STYLES = {
+    'debug': (colorama.Fore.WHITE, 'DEBUG'),
+    'print': (colorama.Fore.BLUE, 'PRINT'),
+    'warn': (colorama.Fore.GREEN, 'WARN'),
+    'error': (colorama.Fore.RED, 'ERROR'),
+}
+
+class Logger:
+    def __init__(self, level : str = 'print', log_file : str = None, max_queued : int = 4096, rate_limit : int = 5, rate_window : float = 1.0) -> None:
+        """
+        Hand log lines to a background thread that formats and writes them, so logging never stalls the playback or render threads.
+        The caller only does a level check, a rate limit check and a non-blocking put. When the queue is full the line is dropped and counted.
+        @param level: str - The lowest level written, one of debug, print, warn or error
+        @param log_file: str - Also append every line, without colours, to this file
+        @param max_queued: int - How many lines can wait for the writer before new ones are dropped
+        @param rate_limit: int - How many times the same message is written per rate_window, the repeats are counted instead
+        @param rate_window: float - The rate limit window in seconds
+        @return None
+        """
+        self.min_level : int = LEVELS[level]
+        self.log_file = open(log_file, 'a') if log_file else None
+
+        self.rate_limit : int = rate_limit
+        self.rate_window : float = rate_window
+        self.MAX_TRACKED = 1024 # -> Distinct messages remembered for rate limiting before the table is reset
+        self.recent = {} # -> message -> [window start, count in window, level]
+        self.recent_lock = threading.Lock() # -> Every thread logs, so the table is only touched with this held
+        self.last_sweep : float = 0.0
+
+        self.log_queue = queue.Queue(maxsize=max_queued)
+        self.dropped : int = 0
+
+        self.lock = threading.Lock()
+        self.writer_thread = None
+
+    def log(self, level : str, message) -> None:
+        if LEVELS[level] < self.min_level:
+            return
+
+        now = time.time()
+        message = str(message)
+
+        with self.recent_lock:
+            entry = self.recent.get(message)
+            if entry is None or now - entry[0] >= self.rate_window:
+                suppressed = entry[1] - self.rate_limit if entry is not None and entry[1] > self.rate_limit else 0
+                if len(self.recent) >= self.MAX_TRACKED:
+                    self.recent.clear()
+                self.recent[message] = [now, 1, level]
+
+                if suppressed:
+                    message = f'{message} (and {suppressed} repeats that were not written)'
+            else:
+                entry[1] += 1
+                if entry[1] > self.rate_limit:
+                    return
+
+        if self.writer_thread is None:
+            self.start()
+
+        try:
+            self.log_queue.put_nowait((level, now, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        with self.lock:
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self.writer_loop, name='Logger', daemon=True)
+                self.writer_thread.start()
+
+    def collect_suppressed(self, now : float, everything : bool = False) -> list:
+        """
+        Forget the messages whose rate limit window has passed, and summarise the repeats of them that were not written.
+        @param now: float - The current time
+        @param everything: bool - Summarise every tracked message whether its window has passed or not, for when the logger closes
+        @return A list of log entries to write
+        """
+        self.last_sweep = now
+        summaries = []
+        with self.recent_lock:
+            for message in [message for message, entry in self.recent.items() if everything or now - entry[0] >= self.rate_window]:
+                _, count, level = self.recent.pop(message)
+                if count > self.rate_limit:
+                    summaries.append((level, now, f'{message} ({count - self.rate_limit} more repeats were not written)'))
+        return summaries
+
+    def writer_loop(self) -> None:
+        while True:
+            try:
+                item = self.log_queue.get(timeout=self.rate_window) # -> Wakes up at least once a window to write out the repeat summaries
+            except queue.Empty:
+                self.write_batch(self.collect_suppressed(time.time()))
+                continue
+
+            batch = [item]
+            while item is not None:
+                try:
+                    item = self.log_queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            entries = [entry for entry in batch if entry is not None]
+            closing = batch[-1] is None
+            now = time.time()
+            if closing or now - self.last_sweep >= self.rate_window:
+                entries += self.collect_suppressed(now, closing)
+
+            self.write_batch(entries)
+            for _ in batch:
+                self.log_queue.task_done()
+
+            if closing:
+                return
+
+    def write_batch(self, batch : list) -> None:
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            batch.append(('error', time.time(), f'The log queue was full, {dropped} lines were dropped.'))
+
+        lines, plain_lines = [], []
+        for level, timestamp, message in batch:
+            colour, tag = STYLES[level]
+            line = f"[{datetime.datetime.fromtimestamp(timestamp)}] [{tag}] {message}"
+            lines.append(f"{colour}{line}{colorama.Style.RESET_ALL}")
+            plain_lines.append(line)
+
+        if lines:
+            print('\n'.join(lines), flush=True)
+        if self.log_file is not None and plain_lines:
+            self.log_file.write('\n'.join(plain_lines) + '\n')
+            self.log_file.flush()
+
+    def reset_after_fork(self) -> None:
+        # A forked child gets a copy of the queue and locks but not the writer thread, so it starts over with its own
+        self.log_queue = queue.Queue(maxsize=self.log_queue.maxsize)
+        self.lock = threading.Lock()
+        self.recent_lock = threading.Lock()
+        self.recent = {} # -> The parent's bursts are summarised by the parent, and its lock may have been held mid-update
+        self.writer_thread = None
+        self.dropped = 0
+
+    def flush(self) -> None:
+        # Block until everything queued so far has been written, for before prompting on the console
+        if self.writer_thread is not None:
+            self.log_queue.join()
+
+    def close(self) -> None:
+        if self.writer_thread is not None:
+            self.log_queue.put(None)
+            self.writer_thread.join()
+            self.writer_thread = None
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+logger = Logger()
+atexit.register(lambda: logger.close()) # -> Write out whatever is still queued when the program ends
+os.register_at_fork(after_in_child=lambda: logger.reset_after_fork())
+
+def configure(level : str = 'print', log_file : str = None) -> None:
+    """
+    Replace the shared logger, writing out anything the old one still had queued first.
+    @param level: str - The lowest level written, one of debug, print, warn or error
+    @param log_file: str - Also append the log to this file
+    @return None
+    """
+    global logger
+    previous = logger
+    logger = Logger(level, log_file)
+    previous.close()
+
+def flush():
+    logger.flush()
+
+def close():
+    # For processes that end without running atexit, like pool workers
+    logger.close()
+
+def debug(message):
+    logger.log('debug', message)
+
 def warn(message):
-    print(f"{colorama.Fore.GREEN}[{datetime.datetime.now()}] [WARN] {message}{colorama.Style.RESET_ALL}")
+    logger.log('warn', message)
 
 def error(message):
-    colorama.init()
-    print(f"{colorama.Fore.RED}[{datetime.datetime.now()}] [ERROR] {message}{colorama.Style.RESET_ALL}")
+    logger.log('error', message)
 
 def output(message):
-    colorama.init()
-    print(f"{colorama.Fore.BLUE}[{datetime.datetime.now()}] [PRINT] {message}{colorama.Style.RESET_ALL}")
+    logger.log('print', message)
@@ -0,0 +1,105 @@
+import time
+from collections import deque
+
+class FramePacer:
+    MODES = ('uncapped', 'fixed', 'vsync', 'adaptive')
+
+    def __init__(self, mode : str = 'fixed', target_fps : int = 60, min_fps : int = 20) -> None:
+        """
+        Decide when the render loop draws and how long it sleeps. It never touches the playback clock, the notes are positioned from that on their own.
+        @param mode: str - uncapped spins, fixed sleeps to target_fps, vsync leaves the waiting to display.flip, adaptive lowers the frame rate and drops frames under load
+        @param target_fps: int - The frame rate fixed and adaptive aim for
+        @param min_fps: int - The lowest frame rate adaptive falls back to
+        @return None
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown pacing mode: {mode}, expected one of {self.MODES}')
+
+        self.mode : str = mode
+        self.target_fps : int = target_fps
+        self.min_fps : int = min_fps
+        self.effective_fps : float = target_fps
+
+        self.deadline : float = None
+        self.frame_start : float = None
+        self.work_average : float = 0.0
+        self.drop_next : bool = False
+
+        self.started_wall : float = time.perf_counter()
+        self.started_cpu : float = time.process_time()
+
+        self.frames : int = 0
+        self.dropped : int = 0
+        self.intervals = deque(maxlen=600) # -> Frame start to frame start, for the jitter numbers
+
+    def begin_frame(self) -> bool:
+        """
+        Mark the start of a frame.
+        @return False if adaptive pacing wants this frame dropped, so only events and commands get handled
+        """
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.intervals.append(now - self.frame_start)
+        self.frame_start = now
+
+        if self.drop_next:
+            self.drop_next = False
+            self.dropped += 1
+            return False
+
+        self.frames += 1
+        return True
+
+    def end_frame(self) -> None:
+        """
+        Mark the end of a frame's work and sleep until the next one is due.
+        @return None
+        """
+        if self.mode in ('uncapped', 'vsync'):
+            return
+
+        now = time.perf_counter()
+        work = now - self.frame_start
+        self.work_average = self.work_average * 0.9 + work * 0.1
+
+        if self.mode == 'adaptive':
+            budget = 1 / self.effective_fps
+            if self.work_average > budget * 0.9:
+                self.effective_fps = max(self.min_fps, self.effective_fps * 0.75)
+            elif self.work_average < budget * 0.5:
+                self.effective_fps = min(self.target_fps, self.effective_fps * 1.05)
+
+        period = 1 / (self.effective_fps if self.mode == 'adaptive' else self.target_fps)
+        self.deadline = now if self.deadline is None else self.deadline + period
+
+        if now > self.deadline + period:
+            # More than a whole frame behind, start a fresh grid instead of rendering a burst to catch up
+            self.drop_next = self.mode == 'adaptive'
+            self.deadline = now
+            return
+
+        if self.deadline > now:
+            time.sleep(self.deadline - now)
+
+    def get_stats(self) -> dict:
+        """
+        Summarise how the pacing behaved since it was created.
+        @return A dictionary with the frame counts, the average frame rate, the CPU share of the process and the frame interval jitter
+        """
+        wall = max(time.perf_counter() - self.started_wall, 1e-9)
+        cpu = time.process_time() - self.started_cpu
+
+        intervals = sorted(self.intervals)
+        mean = sum(intervals) / len(intervals) if intervals else 0.0
+        jitter = (sum((interval - mean) ** 2 for interval in intervals) / len(intervals)) ** 0.5 if intervals else 0.0
+
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'fps': self.frames / wall,
+            'cpu_percent': cpu / wall * 100, # -> Compare against an uncapped run for the CPU time saved, uncapped sits at about a full core
+            'interval_mean_ms': mean * 1000,
+            'interval_jitter_ms': jitter * 1000,
+            'interval_p95_ms': intervals[min(len(intervals) - 1, int(len(intervals) * 0.95))] * 1000 if intervals else 0.0,
+        }
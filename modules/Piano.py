@@ -9,9 +9,20 @@ from modules.Shapes import *
 from modules.PianoObjects import *
 from modules.Output import *
 from modules.ObjectController import ObjectManager
+from modules.Scheduler import EventScheduler, StreamScheduler
+from modules.Clock import PlaybackClock
+from modules.Animation import NoteAnimator
+from modules.Keyboard import KeyboardLayout
+from modules.NoteIndex import NoteIndex
+from modules.Profiler import profiler
+from modules.Startup import init_pygame
+from modules.Playlist import PlaylistLoader
 
 from modules.Midi import MidiParser
+from modules.Midi import MIDIListener
+from modules.MidiCache import MidiCache
 from modules.Midi import MidiSynthesiser
+from modules.Midi import MidiSerializer
 
 class PianoVisualiser:
     def __init__(self, objManager : ObjectManager, renderManager ):
@@ -22,30 +33,38 @@ class PianoVisualiser:
         @return None
         """
         
-        self.screen_width = 1280
-        self.screen_height = 720
+        self.screen_width = renderManager.screen_width
+        self.screen_height = renderManager.screen_height
 
-        self.TOTAL_WHITE_KEYS = 56
-        self.WIDTH_WHITE_KEY_SPACE = 22
+        self.KEY_COUNT = 88 # -> 61, 76 or 88
 
         self.WHITE_KEY_COLOUR = (255, 255, 255)
         self.BLACK_KEY_COLOUR = (0, 0, 0)
         self.KEY_DOWN_COLOUR = (0, 255, 0)
+        self.PEDAL_UP_COLOUR = (60, 60, 60)
+        self.PEDAL_DOWN_COLOUR = (255, 200, 0)
 
         self.NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
         self.NOTES_IN_OCTAVE = len(self.NOTES)
         self.NOTE_SCALE = 100
 
-        self.TIME_SCALE = .999
-        self.TIME_STEP = 0.001 # -> This requires tweaking (SOMETIMES) unfortunately
+        self.PLAYBACK_RATE = 1.0
+        self.LIVE_STOP_TIMEOUT = 2.0 # -> How long closing the window waits for live mode to finish the recording
 
         self.time = 0.0
 
-        self.white_key_width = self.screen_width / self.TOTAL_WHITE_KEYS
-        self.white_key_height = (self.screen_height / 7) + 500
+        self.white_key_height = (self.screen_height / 7) + 500 # -> The y of the top of the keys
+
+        self.keyboard = KeyboardLayout(self.KEY_COUNT, self.screen_width, self.white_key_height)
 
         self.keys = []
         self.notes_and_shapes = {}
+        self.pedal_down = False
+        self.pedal_shape = Square(pygame.Vector2(self.screen_width - 110, 10), (100, 12), self.PEDAL_UP_COLOUR, LAYER_OVERLAY) # -> Lights up while the sustain pedal is down
+
+        self.playback_clock = PlaybackClock(self.PLAYBACK_RATE)
+        self.note_index : NoteIndex = None
+        self.scheduler_stats = None # -> The jitter statistics of the last piece that was played
 
         self.midi_synthesier = MidiSynthesiser()
         self.object_manager : ObjectManager = objManager
@@ -54,48 +73,39 @@ class PianoVisualiser:
         self.visualisation_running = False
         self.note_fall = True
         self.playing_piece = False
-
-        pygame.init()
+        self.use_note_table = True
+        self.stream_playback = False # -> Play straight from MidiParser.stream_midi instead of parsing the whole file first
+        self.live_port = 0
+        self.record_path = None # -> Record the live input to this .mid file
+        self.playlist = [] # -> MIDI files for play_playlist_thread, parsed ahead in worker processes
+        self.repeat_playlist = False
+        self.midi_cache = MidiCache()
+
+        self.note_animator = NoteAnimator(self.get_piece_time, self.keyboard, self.white_key_height, self.NOTE_SCALE)
+        self.render_manager.add_animator(self.note_animator, LAYER_NOTES)
+
+        init_pygame()
         self.clock = pygame.time.Clock()
           
     def draw_keys(self):
         """
         Draw the keys for the piano interface, including white and black keys.
         @param self - the instance of the class
-        @return The list of keys that have been drawn
+        @return The list of keys that have been drawn, followed by the pedal indicator
         """
-        key_space = 0
-
-        for i in range(self.TOTAL_WHITE_KEYS):
-            white_key = Square(pygame.Vector2(key_space, self.white_key_height), (self.WIDTH_WHITE_KEY_SPACE, 120), self.WHITE_KEY_COLOUR)
-            self.keys.append(white_key)
-
-            if i % 7 != 2 and i % 7 != 6:
-                black_key = Square(pygame.Vector2(key_space + (self.white_key_width - self.WIDTH_WHITE_KEY_SPACE / 2), self.white_key_height), (self.WIDTH_WHITE_KEY_SPACE / 2, 80), self.BLACK_KEY_COLOUR)
-                self.keys.append(black_key)
-
-            key_space += self.white_key_width
+        self.keys = self.keyboard.build_shapes(self.WHITE_KEY_COLOUR, self.BLACK_KEY_COLOUR)
 
         self.assign_key_names()
-        return self.keys
+        return self.keys + [self.pedal_shape]
 
     def assign_key_names(self):
         """
-        Assign key names to the keys based on their position in the list of keys.
+        Assign key names to the keys based on the pitch each one plays, for looking keys up by name.
         @param self - the object instance
         @return None
         """
-        for i, key in enumerate(self.keys):
-            octave = (i // self.NOTES_IN_OCTAVE) 
-            note_index = i % self.NOTES_IN_OCTAVE
-
-            note = self.NOTES[note_index]
-            if note in ['C#', 'D#', 'F#', 'G#', 'A#']:
-                key_name = f"{note}{octave}"
-            else:
-                key_name = f"{note}{octave}"
-
-            self.notes_and_shapes[key_name] = key
+        for pitch in range(self.keyboard.lowest_pitch, self.keyboard.highest_pitch + 1):
+            self.notes_and_shapes[MidiParser().midi_note_number_to_name(pitch)] = self.keyboard.shapes[pitch]
 
     def get_shape_by_key(self, key):
         """
@@ -106,39 +116,39 @@ class PianoVisualiser:
         """
         return self.notes_and_shapes.get(key, None)
     
-    def press_note(self, note_object : N_Note, midParser : MidiParser):
+    def press_note(self, note_object : N_Note, midParser : MidiParser, scheduled : float = None):
         """
         Press a note on the synthesizer and update the corresponding shape on the interface.
         @param note_object: N_Note - The note object to be played.
         @param midParser: MidiParser - The MIDI parser object.
+        @param scheduled: float - The perf_counter time the note should sound at, now if not given.
         @return None.
         """
-        self.midi_synthesier.play_note(note_object.pitch, note_object.velocity)
+        self.midi_synthesier.play_note(note_object.pitch, note_object.velocity, scheduled)
 
-        key_note = midParser.midi_note_number_to_name(note_object.pitch)
-        shape : Shape = self.get_shape_by_key(key_note)
+        shape : Shape = self.keyboard.shapes[note_object.pitch]
         if not shape:
-            error(f'Failed to get the shape for the pitch: {note_object.pitch} ({key_note})')
+            error(f'Failed to get the shape for the pitch: {note_object.pitch} ({midParser.midi_note_number_to_name(note_object.pitch)})')
             return
         
-        shape.colour = self.KEY_DOWN_COLOUR 
+        self.render_manager.update_object(shape, colour=self.KEY_DOWN_COLOUR)
 
-    def lift_note(self, note_object : N_Note, midParser : MidiParser) -> None:
+    def lift_note(self, note_object : N_Note, midParser : MidiParser, scheduled : float = None) -> None:
         """
         Lift a note by stopping the note on the MIDI synthesizer, retrieving the key note, and resetting the shape's color.
         @param note_object - The note object to be lifted
         @param midParser - The MIDI parser object
+        @param scheduled - The perf_counter time the note should stop at, now if not given
         @return None
         """
-        self.midi_synthesier.stop_note(note_object.pitch, note_object.velocity)
+        self.midi_synthesier.stop_note(note_object.pitch, note_object.velocity, scheduled)
 
-        key_note = midParser.midi_note_number_to_name(note_object.pitch)    
-        shape : Shape = self.get_shape_by_key(key_note)
+        shape : Shape = self.keyboard.shapes[note_object.pitch]
         if not shape:
             error(f'Failed to get the shape for {note_object.pitch}')
             return
     
-        shape.colour = shape.original_colour
+        self.render_manager.update_object(shape, colour=shape.original_colour)
 
     def split_note_array_by_instruments(self, note_array: list[N_Note]) -> dict:
         """
@@ -179,98 +189,62 @@ class PianoVisualiser:
             if note.pedal:
                 return index, note
     
-    def press_note_array(self, note_array : list, end_duration : float, start_duration : float, midParser : MidiParser) -> None:
-        """
-        Press notes in the note array with a specified duration and using a MidiParser.
-        @param note_array - list of notes to be pressed
-        @param end_duration - the end duration of the note
-        @param start_duration - the start duration of the note
-        @param midParser - the MidiParser object
-        @return None
-        """
-        for note in note_array:
-            self.press_note(note, midParser)
-        
-        scaled_length = ((end_duration - start_duration) * self.TIME_SCALE / len(note_array))
-        time.sleep(scaled_length) 
-
-        for note in note_array:
-            self.lift_note(note, midParser) 
-    
-    def do_note_array(self, note_array : list, end_duration : float, start_duration : float, midParser : MidiParser) -> None:
+    def do_note_array(self, note_array : list, scheduler : EventScheduler, midParser : MidiParser) -> None:
         """
-        Define a method to process a note array with specified durations and a MIDI parser.
-        @param note_array: list - The array of notes to process.
-        @param end_duration: float - The end duration of the notes.
-        @param start_duration: float - The start duration of the notes.
+        Press every note in the array and hand its release to the scheduler, so no thread is needed per chord.
+        The rising notes are drawn by the NoteAnimator from the playback clock, so nothing is spawned for them either.
+        @param note_array: list - The array of notes to press.
+        @param scheduler: EventScheduler - The scheduler that will release the notes at their real end times.
         @param midParser: MidiParser - The MIDI parser object.
         @return None
         """
-        if end_duration == 0:
+        if len(note_array) <= 0:
             return
-        
-        if len(note_array) != 1:
-            note_array_by_instruments : dict = self.split_note_array_by_instruments(note_array)
-            for instrument_index, note_arrays in note_array_by_instruments.items():
-                Thread(target=self.press_note_array, args=(note_arrays, end_duration, start_duration, midParser, ), daemon=True).start()
-                
-                if self.note_fall:
-                    Thread(target=self.fall_note_array, args=(note_arrays, midParser, ), daemon=True).start()
-        else:
-            Thread(target=self.press_note_array, args=(note_array, end_duration, start_duration, midParser, ), daemon=True).start()
-            
-            if self.note_fall:
-                Thread(target=self.fall_note_array, args=(note_array, midParser, ), daemon=True).start()
-    
-    # object animations, will make into a own class later on (🙏🙏)
-    def object_up_animate(self, object: Shape, duration: float):
-        """
-        Animate an object moving upwards on the screen.
-        @param object - The object to animate
-        @param duration - The duration of the animation
-        @return None
-        """
 
-        initial_y_position = 600
-        CONST_SPEED = 200
+        for note in note_array:
+            scheduled = self.playback_clock.get_wall_time(note.start)
+            if note.pedal:
+                for released in scheduler.apply_control(note):
+                    self.lift_note(released, midParser, scheduled)
+                self.show_pedal(scheduler.sustain)
+                continue
 
-        object = Square(object.position + Vector2(0, initial_y_position), object.size, (255,0,255))
-        speed = -(CONST_SPEED)
+            restruck = scheduler.pop_restruck(note)
+            if restruck is None and scheduler.is_sounding(note):
+                restruck = note # -> Struck again while still sounding, the earlier note's own note-off is skipped by the scheduler
+            if restruck is not None:
+                self.lift_note(restruck, midParser, scheduled) # a note-off after the new note-on would cut the new note short
 
-        elapsed_time = 0
-        time_step = 0.01
-        object.size = (object.size[0], duration * self.NOTE_SCALE)
-        
-        object = self.render_manager.insert_object(object)
-        duration_scaler = duration < 1.5 and 20 or 2
-        while elapsed_time <= (duration * duration_scaler):
-            elapsed_time += time_step
-            time.sleep(time_step)
+            self.press_note(note, midParser, scheduled)
+            scheduler.push_note_off(note)
 
-            delta_y = speed * elapsed_time  
-            new_y = initial_y_position + delta_y
+        self.note_animator.add_notes(note_array)
 
-            new_position = Vector2(object.position.x, new_y)
-            object.position = new_position
+    def show_pedal(self, sustained_instruments : set) -> None:
+        # Compared against our own copy, the shape's colour only changes once the render thread applies the command
+        pedal_down = bool(sustained_instruments)
+        if pedal_down != self.pedal_down:
+            self.pedal_down = pedal_down
+            self.render_manager.update_object(self.pedal_shape, colour=self.PEDAL_DOWN_COLOUR if pedal_down else self.PEDAL_UP_COLOUR)
 
-        self.render_manager.remove_object(object)
+    
+    def get_shape_by_pitch(self, pitch):
+        """
+        Retrieve the key shape for a MIDI pitch.
+        @param pitch - the MIDI note number
+        @return The shape of the key, or None if the pitch is not on the keyboard.
+        """
+        return self.keyboard.shapes[pitch]
 
-    def fall_note_array(self, note_array, midParser):
+    def get_piece_time(self) -> float:
         """
-        Animate falling objects based on the notes in the note array.
-        @param note_array - Array of notes to animate
-        @param midParser - MIDI parser object
-        @return None
+        Get the current position in the piece from the playback clock.
+        @return The piece time in seconds
         """
+        if not self.playing_piece:
+            return self.time
         
-        for note in note_array:
-            note_duration = note.end - note.start
-
-            note_keyname = midParser.midi_note_number_to_name(note.pitch)
-            if note_keyname:
-                note_shape = self.get_shape_by_key(note_keyname)
-                if note_shape:
-                    Thread(target = self.object_up_animate, args=(note_shape, note_duration, ), daemon=True).start()
+        return self.playback_clock.now()
 
     def stop_midi(self) -> None:
         """
@@ -279,12 +253,13 @@ class PianoVisualiser:
         """
         if self.playing_piece:
             self.playing_piece = False
+            self.playback_clock.wake() # -> The playback thread may be waiting on the clock for a long rest
 
     def play_midi(self, midParser: MidiParser, mid_parser_result: dict) -> None:
         """
         Play a MIDI file using a MIDI parser and the parsed MIDI data.
         @param midParser - An instance of the MidiParser class
-        @param mid_parser_result - A dictionary containing the parsed MIDI data
+        @param mid_parser_result - A dictionary or note table containing the parsed MIDI data
         @return None
         """
         if not self.midi_synthesier.open_port():
@@ -296,14 +271,47 @@ class PianoVisualiser:
         midi_length = midParser.get_midi_length(mid_parser_result)
         warn(f'This piece is: ~{midi_length // 60} minutes long.')
 
-        result_clone = mid_parser_result.copy()
-        notes_by_timestamp = self.group_notes_by_timestamp(result_clone)
+        if isinstance(mid_parser_result, numpy.ndarray):
+            notes_by_timestamp = mid_parser_result # note tables are already sorted, so they are played in place without a copy
+        else:
+            result_clone = mid_parser_result.copy()
+            notes_by_timestamp = self.group_notes_by_timestamp(result_clone)
 
-        start_time = time.time()
+        self.note_index = NoteIndex(notes_by_timestamp)
+        if self.note_fall:
+            self.note_animator.load(self.note_index)
+
+        self.playback_clock.start()
         self.playing_piece = True
 
-        self.play_notes_in_time(notes_by_timestamp, midi_length, midParser, start_time)
+        self.play_notes_in_time(notes_by_timestamp, midi_length, midParser)
         self.playing_piece = False
+        self.note_animator.stop()
+
+    def play_midi_stream(self, midParser : MidiParser, note_stream) -> None:
+        """
+        Play notes straight from a streaming parser, so playback starts without waiting for the whole file to be read.
+        @param midParser - An instance of the MidiParser class
+        @param note_stream - A generator of notes sorted by start time, like MidiParser.stream_midi
+        @return None
+        """
+        if not self.midi_synthesier.open_port():
+            error('Failed to open a port! Audio will not work!')
+            return
+        else:
+            output('Opened a midi output port successfully!')
+
+        scheduler = StreamScheduler(note_stream, self.playback_clock)
+        self.note_index = None
+        if self.note_fall:
+            self.note_animator.load_stream()
+
+        self.playback_clock.start()
+        self.playing_piece = True
+
+        self.run_scheduler(scheduler, midParser)
+        self.playing_piece = False
+        self.note_animator.stop()
 
     def group_notes_by_timestamp(self, result_clone):
         """
@@ -318,55 +326,170 @@ class PianoVisualiser:
                 notes_by_timestamp[timestamp].append(note)
         return notes_by_timestamp
 
-    def play_notes_in_time(self, notes_by_timestamp, midi_length, midParser, start_time):
+    def play_notes_in_time(self, notes_by_timestamp, midi_length, midParser):
         """
-        Play notes in time based on the given notes by timestamp, MIDI length, MIDI parser, and start time.
+        Play notes in time based on the given notes by timestamp, sleeping until each chord or note-off is due instead of polling.
+        Note-ons and note-offs are all sent from this one thread in time order.
         @param notes_by_timestamp - A dictionary mapping timestamps to notes
         @param midi_length - The length of the MIDI file
         @param midParser - The MIDI parser object
-        @param start_time - The starting time for playing notes
         @return None
         """
-        for i in numpy.arange(0, midi_length, self.TIME_STEP):
-            self.time = i
-            notes_to_play = self.get_notes_to_play(notes_by_timestamp, i)
-
-            longest_note, smallest_note = midParser.get_note_range(notes_to_play)
-            self.do_note_array(notes_to_play, longest_note, smallest_note, midParser)
-
-            self.wait_for_next_beat(i, start_time)
+        self.run_scheduler(EventScheduler(notes_by_timestamp, self.playback_clock), midParser)
 
+    def run_scheduler(self, scheduler : EventScheduler, midParser : MidiParser) -> None:
+        """
+        Press and release notes as the scheduler hands them out until the piece ends or is stopped.
+        @param scheduler: EventScheduler - The scheduler holding the notes of the piece
+        @param midParser: MidiParser - The MIDI parser object
+        @return None
+        """
+        jumps = self.playback_clock.jumps
+        while self.playing_piece and (not scheduler.finished() or self.playback_clock.loop is not None):
+            scheduler.wait_for_next_event(lambda: self.playing_piece)
             if not self.playing_piece:
                 break
 
-            self.clock.tick()
+            if self.playback_clock.jumps != jumps:
+                jumps = self.playback_clock.jumps
+                with profiler.span('resync'):
+                    self.resync(scheduler, midParser, self.playback_clock.now())
+                continue
+
+            with profiler.span('schedule'):
+                self.time = scheduler.get_piece_time()
+                for note in scheduler.pop_due_note_offs(self.time):
+                    self.lift_note(note, midParser, self.playback_clock.get_wall_time(note.end))
+
+                notes_to_play = scheduler.pop_due(self.time)
+                self.do_note_array(notes_to_play, scheduler, midParser)
+
+        for note in scheduler.drain_note_offs():
+            self.lift_note(note, midParser)
+        self.show_pedal(scheduler.sustain)
+
+        jitter = self.scheduler_stats = scheduler.get_jitter_stats()
+        output(f"Scheduler jitter over {jitter['events']} events: mean {jitter['mean_ms']:.2f}ms, p95 {jitter['p95_ms']:.2f}ms, max {jitter['max_ms']:.2f}ms")
+
+        lag = self.midi_synthesier.get_send_stats()
+        output(f"MIDI output lag over {lag['messages']} messages in {lag['batches']} batches: mean {lag['mean_ms']:.2f}ms, p95 {lag['p95_ms']:.2f}ms, max {lag['max_ms']:.2f}ms, {lag['blocked_puts']} blocked, {lag['failed_messages']} failed")
+
+    def seek(self, piece_time : float) -> bool:
+        """
+        Jump to a point in the piece that is playing, the animation follows on its next frame and the playback thread on its next wake up.
+        @param piece_time: float - The point in the piece to jump to, in seconds
+        @return True if the seek was applied
+        """
+        if not self.playing_piece or self.note_index is None:
+            error('Can only seek while a parsed piece is playing.')
+            return False
+
+        self.playback_clock.set_position(piece_time)
+        return True
+
+    def set_playback_rate(self, rate : float) -> float:
+        """
+        Change the playback speed live, the scheduler and the animation both read it from the playback clock.
+        @param rate: float - The new speed, between 0.25x and 4x
+        @return The speed that was applied
+        """
+        return self.playback_clock.set_rate(rate)
 
-    def get_notes_to_play(self, notes_by_timestamp, current_time):
+    def set_loop(self, loop_start : float, loop_end : float) -> bool:
         """
-        Given a dictionary of notes by timestamp and the current time, determine which notes should be played based on a time step.
-        @param notes_by_timestamp - Dictionary of notes with timestamps
-        @param current_time - The current time
-        @return List of notes to play
+        Loop the playing piece between an A and a B point.
+        @param loop_start: float - The A point in seconds
+        @param loop_end: float - The B point in seconds
+        @return True if the loop was set
         """
-        notes_to_play = []
-        for timestamp in list(notes_by_timestamp.keys()):
-            if (timestamp - current_time) < self.TIME_STEP:
-                notes_to_play = (notes_by_timestamp[timestamp])
-                del notes_by_timestamp[timestamp]
-        return notes_to_play
+        if not self.playing_piece or self.note_index is None:
+            error('Can only loop while a parsed piece is playing.')
+            return False
+
+        if not self.playback_clock.set_loop(loop_start, loop_end):
+            error(f'Invalid loop region: {loop_start} -> {loop_end}')
+            return False
+        return True
+
+    def clear_loop(self) -> None:
+        self.playback_clock.clear_loop()
 
-    def wait_for_next_beat(self, current_time, start_time):
+    def resync(self, scheduler : EventScheduler, midParser : MidiParser, piece_time : float) -> None:
         """
-        Wait for the next beat based on the current time and start time.
-        @param current_time - the current time
-        @param start_time - the start time
+        Move the playback to a new point after the clock jumped, releasing the held notes and pressing the ones that are sounding there.
+        @param scheduler: EventScheduler - The scheduler of the playing piece
+        @param midParser: MidiParser - The MIDI parser object
+        @param piece_time: float - The point the clock jumped to
         @return None
         """
-        elapsed_time = time.time() - start_time
-        beat_time = (current_time * self.TIME_SCALE)
-        time_to_wait = beat_time - elapsed_time
-        if time_to_wait > 0:
-            pygame.time.wait(int(time_to_wait * 1000))
+        for note in scheduler.drain_note_offs():
+            self.lift_note(note, midParser)
+
+        scheduler.seek(piece_time)
+        self.show_pedal(scheduler.sustain)
+        if self.note_index is not None:
+            for note in self.note_index.sounding(piece_time):
+                self.press_note(note, midParser)
+                scheduler.push_note_off(note)
+
+        self.time = piece_time
+
+    async def play_live(self, listener : MIDIListener) -> None:
+        """
+        Light up the keys from a live MIDI input, every event carries a latency token through to the frame that shows it.
+        @param listener: MIDIListener - A listener with an input already open
+        @return None
+        """
+        tracker = self.render_manager.latency_tracker
+
+        async for event in listener.events():
+            if event.type not in ('note_on', 'note_off'):
+                continue
+
+            shape : Shape = self.keyboard.shapes[event.note]
+            if not shape:
+                continue
+
+            token = tracker.begin(event.timestamp)
+            colour = self.KEY_DOWN_COLOUR if event.type == 'note_on' else shape.original_colour
+            self.render_manager.update_object(shape, token, colour=colour)
+
+    def play_live_thread(self, pianoVisualiser):
+        """
+        Visualise a MIDI keyboard in real time on a separate thread.
+        @param self - the instance of the class
+        @param pianoVisualiser - the piano visualizer object
+        @return None
+        """
+        pianoVisualiser.visualisation_running = True
+
+        listener = MIDIListener()
+        ports = listener.get_all_input_ports()
+        if self.live_port >= len(ports):
+            error(f'There is no MIDI input port {self.live_port}, found: {ports}')
+            return
+
+        listener.open_input(self.live_port)
+        output(f'Listening to: {ports[self.live_port]}')
+
+        if self.record_path is not None:
+            listener.recorder = MidiSerializer()
+            listener.recorder.start(self.record_path)
+            output(f'Recording to: {self.record_path}')
+
+        # The thread is a daemon blocked on the input, so closing the window has to end it for the recording to be finished off
+        live_thread = threading.current_thread()
+        def stop_live():
+            listener.exit()
+            live_thread.join(self.LIVE_STOP_TIMEOUT)
+        self.render_manager.add_exit_callback(stop_live)
+
+        import asyncio # -> Only live mode runs an event loop
+        try:
+            asyncio.run(self.play_live(listener))
+        finally:
+            if listener.recorder is not None:
+                listener.recorder.stop()
 
     def play_midi_thread(self, pianoVisualiser):
         """
@@ -379,9 +502,35 @@ class PianoVisualiser:
         piece = 'C:/Users/Martin/Documents/MIDI Files/Hungarian_Rhapsody_No.2_Friska_-_Franz_Liszt.mid'
         #self.render_manager.scene_objects.append(ImageRect(((1280/2) - 500, 720/2), "C:/Users/Martin/Pictures/Screenshots/Screenshot 2024-03-06 161319.png"))      
 
-        midParser = MidiParser()
-        result = midParser.deserialize_midi(piece)
+        midParser = MidiParser(self.midi_cache if self.use_note_table else None)
+        if self.stream_playback:
+            output(f'Now streaming the selected file: {piece}')
+            self.play_midi_stream(midParser, midParser.stream_midi(piece))
+            output('Finished playing the midi file!')
+            return
+
+        result = midParser.deserialize_midi(piece, self.use_note_table)
         output(f'Now playing the selected file: {piece}')
 
         self.play_midi(midParser, result)
         output('Finished playing the midi file!')
+
+    def play_playlist_thread(self, pianoVisualiser):
+        """
+        Play the files of self.playlist one after another, the next pieces are parsed in worker processes while the current one plays.
+        @param self - the instance of the class
+        @param pianoVisualiser - the piano visualizer object
+        @return None
+        """
+        pianoVisualiser.visualisation_running = True
+
+        loader = PlaylistLoader(self.playlist, self.midi_cache.cache_dir if self.use_note_table else None, repeat=self.repeat_playlist)
+        midParser = MidiParser()
+        try:
+            for piece, note_table in loader:
+                output(f'Now playing the selected file: {piece}')
+                self.play_midi(midParser, note_table)
+        finally:
+            loader.close()
+
+        output('Finished playing the playlist!')
@@ -1,4 +1,8 @@
+import numpy
+
 class N_Note:
+    __slots__ = ('start', 'end', 'pitch', 'velocity', 'instrument_index', 'pedal')
+
     def __init__(self, start : float, end : float, pitch : float, velocity : float, parent_track : int, pedal : bool = False ) -> None:
         self.start : float = start
         self.end : float = end
@@ -8,4 +12,86 @@ class N_Note:
         self.instrument_index : int = parent_track
         self.pedal = pedal
 
+# Columnar layout for a whole piece, 21 bytes a note. The field names match N_Note so a numpy.recarray row can be used wherever an N_Note is.
+# Control changes travel in the same table so they stay in time order with the notes: a row with pedal set is a control change at start,
+# with the controller number in pitch and its value in velocity.
+NOTE_DTYPE = numpy.dtype([('start', numpy.float64), ('end', numpy.float64), ('pitch', numpy.uint8), ('velocity', numpy.uint8), ('instrument_index', numpy.uint16), ('pedal', numpy.uint8)])
+
+SUSTAIN_CONTROLLER = 64 # -> CC64, the sustain (damper) pedal
+SUSTAIN_THRESHOLD = 64 # -> Values from this up hold the pedal down
+PARSED_CONTROLLERS = (SUSTAIN_CONTROLLER,)
+
+def empty_note_table(size : int = 0) -> numpy.recarray:
+    return numpy.zeros(size, dtype=NOTE_DTYPE).view(numpy.recarray)
+
+def to_note_table(notes_by_timestamp : dict) -> numpy.recarray:
+    notes = [note for timestamp in sorted(notes_by_timestamp.keys()) for note in notes_by_timestamp[timestamp]]
+
+    table = empty_note_table(len(notes))
+    for field in NOTE_DTYPE.names:
+        table[field] = [getattr(note, field) for note in notes]
+    return table
+
+class SustainTimeline:
+    def __init__(self, controls : numpy.ndarray) -> None:
+        """
+        The sustain pedal state of every instrument over the piece, built once so a lookup is a binary search per instrument.
+        @param controls: numpy.ndarray - The control change rows of a note table, sorted by start
+        @return None
+        """
+        sustain = controls[controls.pitch == SUSTAIN_CONTROLLER]
+
+        self.instruments = {} # -> instrument index -> (times of its pedal changes, whether the pedal is down after each one)
+        for instrument_index in numpy.unique(sustain.instrument_index).tolist():
+            changes = sustain[sustain.instrument_index == instrument_index]
+            self.instruments[instrument_index] = (numpy.ascontiguousarray(changes.start), changes.velocity >= SUSTAIN_THRESHOLD)
+
+    def get_sustained_instruments(self, piece_time : float, inclusive : bool = True) -> set:
+        """
+        Work out which instruments have the sustain pedal down at a point in the piece.
+        @param piece_time: float - The point in the piece
+        @param inclusive: bool - Whether a pedal change exactly at piece_time counts as having happened
+        @return The set of instrument indices holding the pedal down
+        """
+        side = 'right' if inclusive else 'left'
+
+        sustained = set()
+        for instrument_index, (times, down) in self.instruments.items():
+            passed = numpy.searchsorted(times, piece_time, side)
+            if passed and down[passed - 1]:
+                sustained.add(instrument_index)
+        return sustained
+
+class MidiEvent:
+    __slots__ = ('status', 'data1', 'data2', 'timestamp')
+
+    def __init__(self, message : list, timestamp : float) -> None:
+        self.status : int = message[0]
+        self.data1 : int = message[1] if len(message) > 1 else 0
+        self.data2 : int = message[2] if len(message) > 2 else 0
+        self.timestamp : float = timestamp # -> perf_counter when the message reached us
+
+    @property
+    def type(self) -> str:
+        kind = self.status & 0xF0
+        if kind == 0x90 and self.data2 > 0:
+            return 'note_on'
+        if kind == 0x80 or kind == 0x90:
+            return 'note_off'
+        if kind == 0xB0:
+            return 'control_change'
+        return 'other'
+
+    @property
+    def channel(self) -> int:
+        return self.status & 0x0F
+
+    @property
+    def note(self) -> int:
+        return self.data1
+
+    @property
+    def velocity(self) -> int:
+        return self.data2
+
 # Will move this class to Piano.py later on, cannot be fucked right now
\ No newline at end of file
@@ -0,0 +1,113 @@
+import os, numpy
+from collections import deque
+
+from modules.Output import *
+from modules.PianoObjects import NOTE_DTYPE
+
+def get_playlist_files(paths : list) -> list:
+    """
+    Expand a list of files and directories into the MIDI files to play, directories in name order.
+    @param paths: list - MIDI files or directories holding them
+    @return The list of MIDI file paths
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(('.mid', '.midi')))
+        else:
+            files.append(path)
+    return files
+
+def parse_note_table(midi_file : str, cache_dir : str) -> numpy.ndarray:
+    """
+    Parse a MIDI file into a note table, run in a worker process.
+    @param midi_file: str - The MIDI file to parse
+    @param cache_dir: str - The MIDI cache directory, or None to always parse
+    @return A plain note table array, which pickles back to the parent as one compact buffer
+    """
+    from modules.Midi import MidiParser # -> Imported here so the worker loads only the parser, and the playback process only once it plays a playlist
+    from modules.MidiCache import MidiCache
+
+    table = MidiParser(MidiCache(cache_dir) if cache_dir else None).deserialize_midi(midi_file, True)
+    return numpy.ascontiguousarray(table, NOTE_DTYPE)
+
+def init_worker() -> None:
+    # Pool workers skip atexit, but multiprocessing runs its own finalizers as they exit, so the log is written out there
+    from multiprocessing import util
+    util.Finalize(None, close, exitpriority=0)
+
+class PlaylistLoader:
+    def __init__(self, files : list, cache_dir : str = None, workers : int = 2, lookahead : int = 2, repeat : bool = False) -> None:
+        """
+        Parse the upcoming pieces of a playlist in a process pool while the current one plays, so the next piece is ready the moment it is needed
+        and the parsing never competes with the playback thread for the GIL.
+        @param files: list - The MIDI files to play, in order
+        @param cache_dir: str - The MIDI cache directory the workers read and fill, or None to always parse
+        @param workers: int - How many worker processes parse at once
+        @param lookahead: int - How many pieces are kept parsed or parsing ahead of the one playing
+        @param repeat: bool - Start over from the first file after the last one
+        @return None
+        """
+        self.files : list = files
+        self.cache_dir : str = cache_dir
+        self.lookahead : int = max(1, lookahead)
+        self.repeat : bool = repeat
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Spawned rather than forked, a fork would copy every lock the render, playback and sender threads happen to hold at that moment
+        self.executor = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context('spawn'), initializer=init_worker)
+        self.pending = deque() # -> (path, future) of the pieces submitted ahead, in play order
+        self.next_index : int = 0
+        self.skipped_in_a_row : int = 0 # -> A whole pass of skipped files ends a repeating playlist instead of retrying it forever
+
+    def submit_ahead(self) -> None:
+        while len(self.pending) < self.lookahead and self.files:
+            if self.next_index >= len(self.files):
+                if not self.repeat:
+                    return
+                self.next_index = 0
+
+            path = self.files[self.next_index]
+            self.pending.append((path, self.executor.submit(parse_note_table, path, self.cache_dir)))
+            self.next_index += 1
+
+    def next_piece(self):
+        """
+        Get the next piece, waiting only if its worker has not finished yet. Files that fail to parse are skipped.
+        @return A tuple of the path and its note table, or None once the playlist has ended
+        """
+        self.submit_ahead()
+        while self.pending:
+            if self.skipped_in_a_row >= len(self.files):
+                error('None of the files in the playlist could be played, stopping.')
+                self.pending.clear()
+                return None
+
+            path, future = self.pending.popleft()
+            self.submit_ahead()
+
+            try:
+                table = future.result()
+            except Exception as exception:
+                error(f'Skipping {path}, it failed to parse: {exception}')
+                self.skipped_in_a_row += 1
+                continue
+
+            if len(table) <= 0:
+                error(f'Skipping {path}, it has no notes.')
+                self.skipped_in_a_row += 1
+                continue
+
+            self.skipped_in_a_row = 0
+            return path, table.view(numpy.recarray)
+        return None
+
+    def __iter__(self):
+        while (piece := self.next_piece()) is not None:
+            yield piece
+
+    def close(self) -> None:
+        self.pending.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,167 @@
+import os, time, json, threading, pygame
+from collections import deque
+
+class NullSpan:
+    # Handed out while profiling is off, so a disabled span costs one attribute check and an empty with block
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception) -> None:
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name : str) -> None:
+        self.profiler = profiler
+        self.name : str = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+class Profiler:
+    def __init__(self, max_events : int = 200000, history : int = 120) -> None:
+        """
+        Named timing spans around the main stages of a frame and of playback. Off by default, turn it on with enable().
+        @param max_events: int - How many of the most recent spans are kept for the trace export
+        @param history: int - How many frames the overlay breakdown is averaged over
+        @return None
+        """
+        self.enabled : bool = False
+        self.lock = threading.Lock()
+
+        self.events = deque(maxlen=max_events) # -> (name, thread id, start, end) in perf_counter seconds
+        self.thread_names = {}
+        self.origin : float = time.perf_counter()
+
+        self.frame_totals = {} # -> (thread id, name) -> seconds spent in the current frame
+        self.frames = deque(maxlen=history) # -> The frame_totals of the last few frames
+        self.frame_thread = None # -> The thread calling end_frame, whose spans make up the frame itself
+
+    def enable(self) -> None:
+        self.origin = time.perf_counter()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def span(self, name : str):
+        """
+        Time a block of code, use it as `with profiler.span('draw'):`.
+        @param name: str - The name the block shows up under in the overlay and the trace
+        @return A context manager, a shared do-nothing one while profiling is off
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name : str, start : float, end : float) -> None:
+        thread = threading.current_thread()
+        with self.lock:
+            self.events.append((name, thread.ident, start, end))
+            self.thread_names[thread.ident] = thread.name
+            key = (thread.ident, name)
+            self.frame_totals[key] = self.frame_totals.get(key, 0.0) + (end - start)
+
+    def end_frame(self) -> None:
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.frame_thread = threading.get_ident()
+            self.frames.append(self.frame_totals)
+            self.frame_totals = {}
+
+    def get_breakdown(self) -> dict:
+        """
+        Average the time spent in each span over the recent frames. Spans from other threads than the one ending the frames,
+        like the playback thread, are kept apart under their thread's name so they are not added into the frame's own stages.
+        @return A dictionary of span name to milliseconds per frame, the most expensive first
+        """
+        with self.lock:
+            frames = list(self.frames)
+            thread_names = dict(self.thread_names)
+            frame_thread = self.frame_thread
+
+        if not frames:
+            return {}
+
+        totals = {}
+        for frame in frames:
+            for (thread_id, name), seconds in frame.items():
+                if thread_id != frame_thread:
+                    name = f'{thread_names.get(thread_id, thread_id)}: {name}'
+                totals[name] = totals.get(name, 0.0) + seconds
+
+        return {name: seconds / len(frames) * 1000 for name, seconds in sorted(totals.items(), key=lambda item: -item[1])}
+
+    def dump_chrome_trace(self, path : str) -> int:
+        """
+        Write the recorded spans in the Chrome trace event format, open it in chrome://tracing or ui.perfetto.dev.
+        @param path: str - Where to write the JSON file
+        @return The number of spans written
+        """
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+
+        process_id = os.getpid()
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': process_id, 'tid': thread_id, 'args': {'name': name}} for thread_id, name in thread_names.items()]
+        for name, thread_id, start, end in events:
+            trace.append({
+                'name': name,
+                'ph': 'X', # -> A complete event, start and duration in microseconds
+                'ts': (start - self.origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': process_id,
+                'tid': thread_id,
+            })
+
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+        return len(events)
+
+profiler = Profiler() # -> Shared by the renderer, the parser and the scheduler so every span lands on one timeline
+
+class ProfilerOverlay:
+    def __init__(self, profiler : Profiler, position = (10, 30), refresh_interval : float = 0.5) -> None:
+        """
+        An animator drawing the per-frame span breakdown, the text is only re-rendered a couple of times a second.
+        @param profiler: Profiler - The profiler to show
+        @param position - Where to draw the top line
+        @param refresh_interval: float - Seconds between re-rendering the text
+        @return None
+        """
+        self.profiler : Profiler = profiler
+        self.position = position
+        self.refresh_interval : float = refresh_interval
+
+        self.font = None
+        self.lines = []
+        self.last_refresh : float = 0.0
+
+    def draw(self, surface) -> list:
+        now = time.perf_counter()
+        if not self.lines or now - self.last_refresh >= self.refresh_interval:
+            if self.font is None:
+                self.font = pygame.font.SysFont('monospace', 14) # -> Fixed width so the columns line up
+
+            breakdown = self.profiler.get_breakdown()
+            text = [f'{name:<16} {ms:6.2f}ms' for name, ms in breakdown.items()] or ['profiler waiting for frames']
+            self.lines = [self.font.render(line, True, (200, 200, 200)) for line in text]
+            self.last_refresh = now
+
+        x, y = self.position
+        drawn = []
+        for line in self.lines:
+            drawn.append(surface.blit(line, (x, y)))
+            y += line.get_height()
+        return drawn
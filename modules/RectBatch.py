@@ -0,0 +1,132 @@
+import pygame, numpy
+
+class RectBatchRenderer:
+    def __init__(self, min_batch : int = 256, border_radius : int = 0) -> None:
+        """
+        Fill many axis aligned rectangles into a surface with a handful of NumPy operations instead of one draw call each.
+        Every rectangle adds +1/-1 at its corners into a coverage grid that is summed along both axes. The x axis of that grid
+        is compressed to the distinct rectangle edges, which for notes on a keyboard is only a couple of hundred columns.
+        The covered pixels are then written in one masked copy through pygame.surfarray.
+        @param min_batch: int - Below this many rectangles the caller is better off drawing them one by one
+        @param border_radius: int - Round the corners like pygame.draw.rect does with the same border_radius
+        @return None
+        """
+        self.min_batch : int = min_batch
+        self.border_radius : int = border_radius
+        self.corner_insets = {} # -> radius -> how far in each of the top rows of a corner starts, measured from pygame itself
+
+    def can_draw(self, surface, count : int) -> bool:
+        # surfarray.pixels2d only works on 8, 16 and 32 bit surfaces
+        return count >= self.min_batch and surface.get_bytesize() in (1, 2, 4)
+
+    def draw(self, surface, x, y, width, height, colours) -> pygame.Rect:
+        """
+        Fill the rectangles, clipped to the surface's clip area.
+        @param surface - The surface to draw into
+        @param x, y, width, height - NumPy arrays with one entry per rectangle
+        @param colours - A single colour, or an (n, 3) array with one colour per rectangle. Each colour is drawn in one pass, in the order the colours first appear
+        @return The bounding Rect of everything that was drawn, or None if nothing was
+        """
+        clip = surface.get_clip()
+
+        # pygame truncates the position and the size of a float rect separately
+        left, top = numpy.asarray(x).astype(numpy.intp), numpy.asarray(y).astype(numpy.intp)
+        right, bottom = left + numpy.asarray(width).astype(numpy.intp), top + numpy.asarray(height).astype(numpy.intp)
+
+        colours = numpy.asarray(colours)
+        if self.border_radius > 1:
+            left, right, top, bottom, source = self.round_corners(left, right, top, bottom, colours.ndim > 1) # before clipping, the corners belong to the whole rectangle
+            if colours.ndim > 1:
+                colours = colours[source]
+
+        left, right = numpy.clip(left, clip.left, clip.right), numpy.clip(right, clip.left, clip.right)
+        top, bottom = numpy.clip(top, clip.top, clip.bottom), numpy.clip(bottom, clip.top, clip.bottom)
+
+        visible = (right > left) & (bottom > top)
+        if not visible.any():
+            return None
+
+        left, right, top, bottom = left[visible], right[visible], top[visible], bottom[visible]
+        bounds = pygame.Rect(int(left.min()), int(top.min()), int(right.max() - left.min()), int(bottom.max() - top.min()))
+
+        if colours.ndim == 1:
+            groups = [(colours, slice(None))]
+        else:
+            colours = colours[visible]
+            unique, first_seen, inverse = numpy.unique(colours, axis=0, return_index=True, return_inverse=True)
+            inverse = inverse.ravel()
+            groups = [(unique[i], inverse == i) for i in numpy.argsort(first_seen)]
+
+        pixels = pygame.surfarray.pixels2d(surface) # -> (width, height) view of the surface, locked until it is deleted
+        try:
+            region = pixels[bounds.left:bounds.right, bounds.top:bounds.bottom]
+            for colour, members in groups:
+                mask = self.get_coverage(left[members] - bounds.left, right[members] - bounds.left, top[members] - bounds.top, bottom[members] - bounds.top, bounds.width, bounds.height)
+                numpy.copyto(region, surface.map_rgb(tuple(int(channel) for channel in colour)), where=mask.T)
+        finally:
+            del pixels
+
+        return bounds
+
+    def get_corner_insets(self, radius : int) -> list:
+        if radius not in self.corner_insets:
+            size = radius * 2 + 2 # -> Big enough that pygame does not shrink the radius
+            stamp = pygame.Surface((size, size))
+            pygame.draw.rect(stamp, (255, 255, 255), (0, 0, size, size), border_radius=radius)
+
+            covered = pygame.surfarray.array2d(stamp) != 0
+            insets = [int(numpy.argmax(covered[:, row])) for row in range(radius)]
+            while insets and insets[-1] == 0:
+                insets.pop()
+            self.corner_insets[radius] = insets
+
+        return self.corner_insets[radius]
+
+    def round_corners(self, left, right, top, bottom, keep_order : bool = True) -> tuple:
+        """
+        Split every rectangle into the strips whose union is the shape pygame.draw.rect fills with rounded corners. Each inset row of a corner
+        gives one strip, narrowed by that inset and running down to the matching row at the bottom, and one more strip covers the full width
+        between the corners. pygame shrinks the radius to half the shorter side, so small rectangles get smaller corners.
+        @param keep_order: bool - Put the strips back in the order of their rectangles, only needed when that sets the colour order
+        @return The left, right, top and bottom arrays of the strips, and the index of the rectangle each strip came from
+        """
+        radii = numpy.minimum(self.border_radius, numpy.minimum(right - left, bottom - top) // 2)
+
+        square = numpy.flatnonzero(radii <= 1)
+        parts = [(left[square], right[square], top[square], bottom[square], square)]
+        for radius in numpy.unique(radii[radii > 1]).tolist():
+            members = numpy.flatnonzero(radii == radius)
+            member_left, member_right, member_top, member_bottom = left[members], right[members], top[members], bottom[members]
+
+            insets = self.get_corner_insets(radius)
+            parts.append((member_left, member_right, member_top + len(insets), member_bottom - len(insets), members))
+            for row, inset in enumerate(insets):
+                parts.append((member_left + inset, member_right - inset, member_top + row, member_bottom - row, members))
+
+        left, right, top, bottom, source = (numpy.concatenate(column) for column in zip(*parts))
+        if not keep_order:
+            return left, right, top, bottom, source
+
+        order = numpy.argsort(source, kind='stable') # -> Back in the order of the rectangles, which sets the order the colours are drawn in
+        return left[order], right[order], top[order], bottom[order], source[order]
+
+    def get_coverage(self, left, right, top, bottom, width : int, height : int) -> numpy.ndarray:
+        """
+        Work out which pixels of a width x height area at least one rectangle covers.
+        @return A (height, width) boolean array
+        """
+        edges, columns_of_edges = numpy.unique(numpy.concatenate((left, right)), return_inverse=True)
+        first, last = columns_of_edges[:len(left)], columns_of_edges[len(left):]
+
+        # One row per pixel row, one column per span between two neighbouring edges
+        columns = len(edges)
+        corners = numpy.concatenate((top * columns + first, top * columns + last, bottom * columns + first, bottom * columns + last))
+        weights = numpy.repeat(numpy.array((1, -1, -1, 1), numpy.int32), len(left))
+
+        difference = numpy.bincount(corners, weights, (height + 1) * columns).astype(numpy.int32).reshape(height + 1, columns)
+        spans = difference.cumsum(0).cumsum(1)[:height] > 0
+
+        # Every pixel column takes the span it falls in, columns left of the first edge point at an empty extra span
+        spans = numpy.concatenate((spans, numpy.zeros((height, 1), bool)), 1)
+        span_of_column = numpy.searchsorted(edges, numpy.arange(width), 'right') - 1
+        return spans[:, span_of_column]
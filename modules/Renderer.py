@@ -1,21 +1,59 @@
-import pygame, math, threading
-from modules import Piano
+import pygame, math, bisect, threading
+from collections import deque
+
+from modules.Output import *
+from modules.Pacing import FramePacer
+from modules.Latency import LatencyTracker
+from modules.Profiler import profiler
+from modules.Startup import startup, init_pygame, quit_pygame
+from modules.ObjectController import ObjectManager
+from modules.Shapes import LAYER_OVERLAY, LAYER_COUNT
 
 class Scene:
-    def __init__(self, scene_name) -> None:
-        pygame.init()
+    def __init__(self, scene_name, dirty_rendering : bool = False, pacing_mode : str = 'fixed', target_fps : int = 60) -> None:
+        init_pygame()
 
         self.screen_width = 1280
         self.screen_height = 720
 
-        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
+        self.pacer = FramePacer(pacing_mode, target_fps)
+        self.screen = self.create_screen()
         self.clock = pygame.time.Clock()
 
-        self.scene_objects = [] 
+        self.scene_objects = ObjectManager() # -> Only ever changed by the render thread when it applies the queued commands
+        self.render_commands = deque() # -> Producers append (op, object, attributes) from any thread, drained once per frame
+        self.commands_last_frame = 0
+        self.commands_total = 0
+
+        self.latency_tracker = LatencyTracker()
+        self.latency_json_path = None # -> Where to dump the latency statistics on exit
+        self.latency_tokens = [] # -> Tokens applied since the last flip, closed once that flip returns
+        self.trace_path = None # -> Where to write the profiler's Chrome trace on exit
+        self.animators = []
         self.scene_name = scene_name
         self.running = True
 
+        self.BACKGROUND_COLOUR = (30, 30, 30)
+        self.MAX_DIRTY_RECTS = 256 # -> Past this many rects a single full flip is cheaper than the update list
+
+        self.dirty_rendering = dirty_rendering # -> Only push the rects that changed, with the static objects cached in self.background
+        self.background = None
+        self.object_states = {}
+        self.previous_dirty = []
+
         self.threads = []
+        self.exit_callbacks = [] # -> Run by clean before the threads are joined, to stop whatever a daemon thread is blocked on
+
+    def create_screen(self):
+        if self.pacer.mode != 'vsync':
+            return pygame.display.set_mode((self.screen_width, self.screen_height))
+
+        try:
+            return pygame.display.set_mode((self.screen_width, self.screen_height), pygame.SCALED, vsync=1)
+        except pygame.error as exception:
+            error(f'Vsync is not available ({exception}), falling back to a fixed frame rate.')
+            self.pacer.mode = 'fixed'
+            return pygame.display.set_mode((self.screen_width, self.screen_height))
 
     def handle_events(self):
         for event in pygame.event.get():
@@ -23,53 +61,264 @@ class Scene:
                 self.running = False
 
     def insert_object(self, object : pygame.Rect):
-        self.scene_objects.append(object)
-        return self.scene_objects[self.scene_objects.index(object)] # returns a direct reference to the object within the render queue
+        self.render_commands.append(('insert', object, None, None))
+        return object # the object shows up from the next frame on
     
+    def update_object(self, object, latency_token = None, **attributes):
+        if latency_token is not None:
+            self.latency_tracker.mark(latency_token, 'update')
+        self.render_commands.append(('update', object, attributes, latency_token))
+
     def remove_object(self, object):
-        self.scene_objects.remove(object)
+        self.render_commands.append(('remove', object, None, None))
+
+    def apply_render_commands(self) -> int:
+        """
+        Apply the commands queued since the last frame in one batch, commands queued while this runs wait for the next frame.
+        @return The number of commands applied
+        """
+        count = len(self.render_commands)
+        for _ in range(count):
+            op, object, attributes, latency_token = self.render_commands.popleft()
+
+            if latency_token is not None:
+                self.latency_tracker.mark(latency_token, 'applied')
+                self.latency_tokens.append(latency_token)
+
+            if op == 'insert':
+                self.scene_objects.insert(object)
+            elif op == 'remove':
+                self.scene_objects.remove_object(object)
+            else:
+                for name, value in attributes.items():
+                    setattr(object, name, value)
+
+        self.commands_last_frame = count
+        self.commands_total += count
+        return count
+
+    def add_animator(self, animator, layer : int = LAYER_OVERLAY):
+        # Animators are drawn once per frame from the render thread, after the scene objects of their own layer and under the ones above it
+        bisect.insort(self.animators, (layer, animator), key=lambda entry: entry[0])
+
+    def add_exit_callback(self, callback) -> None:
+        self.exit_callbacks.append(callback)
 
     def clean(self):
+        for callback in self.exit_callbacks:
+            callback()
+
         for thread in self.threads:
             t : threading.Thread = thread
             if not t.isDaemon() and t.is_alive():
                 t.join()
-                
-        pygame.quit()
 
-    def order_draw_order_by_z_index(self):
-        pass # Shape class will contain Z-index value, before starting to draw, we sort it by the z index, low to high (lower values get drawn first)
+        if self.latency_json_path:
+            self.latency_tracker.dump_json(self.latency_json_path)
+            output(f'Wrote the latency statistics to {self.latency_json_path}')
+
+        if self.trace_path:
+            count = profiler.dump_chrome_trace(self.trace_path)
+            output(f'Wrote {count} profiler spans to {self.trace_path}')
+
+        stats = self.pacer.get_stats()
+        output(f"Pacing ({stats['mode']}): {stats['fps']:.1f} FPS, {stats['dropped']} dropped, {stats['cpu_percent']:.1f}% CPU, frame jitter {stats['interval_jitter_ms']:.2f}ms")
+                
+        quit_pygame()
 
     def fill_scene(self, objects):
         for obj in objects:
             self.insert_object(obj)
 
+    def get_object_state(self, object):
+        size = object.size
+        if hasattr(size, '__len__'):
+            size = tuple(size)
+        return object.colour, object.position.x, object.position.y, size
+
+    def get_object_bounds(self, object, fallback : pygame.Rect) -> pygame.Rect:
+        # Where a moved object will land, only rectangular shapes can be worked out before drawing
+        if hasattr(object.size, '__len__') and len(object.size) == 2:
+            return pygame.Rect(object.position, object.size)
+        return fallback
+
+    def build_background(self):
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(self.BACKGROUND_COLOUR)
+
+        self.object_states = {}
+        for object in self.scene_objects.draw_order():
+            object.draw(self.background)
+            self.object_states[object.ID] = (self.get_object_state(object), pygame.Rect(object.object))
+
+    def refresh_background(self) -> list:
+        """
+        Redraw the objects that changed since the last frame onto the cached background.
+        @return The list of rects that changed, or None if the whole background had to be rebuilt
+        """
+        if self.background is None or len(self.object_states) != len(self.scene_objects):
+            self.build_background()
+            return None
+
+        changed = []
+        for object in self.scene_objects.draw_order():
+            entry = self.object_states.get(object.ID)
+            if entry is None:
+                self.build_background()
+                return None
+
+            if entry[0] != self.get_object_state(object):
+                changed.append(entry[1].union(self.get_object_bounds(object, entry[1])))
+
+        if not changed:
+            return changed
+
+        # Repaint every object touching a changed area, in draw order and clipped to it, so overlapping keys stay stacked correctly
+        for area in changed:
+            self.background.set_clip(area)
+            self.background.fill(self.BACKGROUND_COLOUR)
+
+            for object in self.scene_objects.draw_order():
+                state, rect = self.object_states[object.ID]
+                if rect.colliderect(area):
+                    object.draw(self.background) # clipped, so object.object would only hold the part inside the area
+                    self.object_states[object.ID] = (self.get_object_state(object), self.get_object_bounds(object, rect))
+
+        self.background.set_clip(None)
+        return changed
+
+    def draw_full(self):
+        self.screen.fill(self.BACKGROUND_COLOUR)
+
+        animators = iter(self.animators)
+        animator = next(animators, None)
+        for layer in range(LAYER_COUNT):
+            for object in self.scene_objects.get_layer(layer):
+                object.draw(self.screen)
+
+            while animator is not None and animator[0] == layer:
+                animator[1].draw(self.screen)
+                animator = next(animators, None)
+
+    def draw_animators(self) -> list:
+        """
+        Draw the animators over the background on the screen, then redraw the objects on higher layers wherever an animator drew over them.
+        @return The rects the animators drew
+        """
+        drawn = []
+        for layer, animator in self.animators:
+            rects = animator.draw(self.screen) or []
+            if rects and layer < LAYER_COUNT - 1:
+                self.redraw_above(rects, layer)
+            drawn += rects
+        return drawn
+
+    def redraw_above(self, rects : list, layer : int) -> None:
+        above = list(self.scene_objects.draw_order(layer + 1))
+        if not above:
+            return
+
+        bounds = [self.object_states[object.ID][1] for object in above]
+        for area in rects:
+            covered = area.collidelistall(bounds)
+            if not covered:
+                continue
+
+            # Clipped like refresh_background, so overlapping objects keep their order
+            self.screen.set_clip(area)
+            for index in covered:
+                above[index].draw(self.screen)
+        self.screen.set_clip(None)
+
+    def draw_dirty(self):
+        """
+        Redraw only what changed since the last frame, without presenting it so the flip is timed on its own.
+        @return The rects to present, None for the whole screen, or an empty list when nothing changed
+        """
+        changed = self.refresh_background()
+
+        if changed is None:
+            self.screen.blit(self.background, (0, 0))
+
+            self.previous_dirty = self.draw_animators()
+            return None
+
+        # Erase last frame's animated rects and the changed objects, then draw this frame's on top
+        dirty = changed + self.previous_dirty
+        for rect in dirty:
+            self.screen.blit(self.background, rect, rect)
+
+        drawn = self.draw_animators()
+
+        dirty += drawn
+        self.previous_dirty = drawn
+
+        if len(dirty) > self.MAX_DIRTY_RECTS:
+            return None
+        return dirty
+
+    def present(self, rects : list = None) -> None:
+        with profiler.span('flip'):
+            if rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(rects)
+
+        if not startup.finished:
+            startup.finish()
+
     def run(self, custom_functions):  
         while self.running:
-            self.handle_events()
-            self.screen.fill((30,30,30))
-
-            for item in custom_functions:
-                if len(item) == 2:
-                    # Custom arguement functionality TODO will have to setup a more modular system for this later.
-                    void, arg = item
-                    if arg is not None and type(arg) is Piano.PianoVisualiser and not arg.visualisation_running:
-                        thread = threading.Thread(target=void, args=(arg,), daemon=True)
-                        thread.start()
-
-                        self.threads.append(thread)
-                else:
-                    void = item[0]
-                    thread = threading.Thread(target=void, daemon=True)
-                    thread.start()
-                    
-                    self.threads.append(thread)
-                        
-            for object in self.scene_objects:
-                object.draw(self.screen)
+            with profiler.span('events'):
+                self.handle_events()
+            with profiler.span('commands'):
+                self.apply_render_commands()
+
+            with profiler.span('dispatch'):
+                self.dispatch(custom_functions)
+
+            if not self.pacer.begin_frame():
+                self.pacer.end_frame()
+                continue
+
+            fps = self.clock.get_fps() # -> inf when uncapped frames take under the millisecond the clock counts in
+            pygame.display.set_caption(f"{self.scene_name} | FPS: {math.ceil(fps) if math.isfinite(fps) else '1000+'} | OBJECTS: {len(self.scene_objects)} | OPS: {self.commands_last_frame}") 
 
-            pygame.display.set_caption(f"{self.scene_name} | FPS: {math.ceil(self.clock.get_fps())} | OBJECTS: {len(self.scene_objects)}") 
-            pygame.display.flip()
-            self.clock.tick(0)
+            if self.dirty_rendering:
+                with profiler.span('draw'):
+                    dirty = self.draw_dirty()
+                if dirty is None:
+                    self.present()
+                elif dirty:
+                    self.present(dirty)
+            else:
+                with profiler.span('draw'):
+                    self.draw_full()
+                self.present()
 
-        self.clean()
\ No newline at end of file
+            if self.latency_tokens:
+                self.latency_tracker.finish(self.latency_tokens)
+                self.latency_tokens = []
+
+            profiler.end_frame()
+            self.pacer.end_frame()
+            self.clock.tick()
+
+        self.clean()
+
+    def dispatch(self, custom_functions):
+        for item in custom_functions:
+            if len(item) == 2:
+                # Custom arguement functionality TODO will have to setup a more modular system for this later.
+                void, arg = item
+                if arg is not None and not getattr(arg, 'visualisation_running', True): # -> Only visualisers have the flag, so nothing else is started here
+                    thread = threading.Thread(target=void, args=(arg,), daemon=True)
+                    thread.start()
+
+                    self.threads.append(thread)
+            else:
+                void = item[0]
+                thread = threading.Thread(target=void, daemon=True)
+                thread.start()
+                
+                self.threads.append(thread)
\ No newline at end of file
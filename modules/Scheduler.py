@@ -0,0 +1,264 @@
+import bisect, heapq, numpy
+
+from modules.Output import *
+from modules.Clock import PlaybackClock
+from modules.PianoObjects import SUSTAIN_CONTROLLER, SUSTAIN_THRESHOLD, to_note_table, SustainTimeline
+
+class EventScheduler:
+    def __init__(self, notes_by_timestamp, clock : PlaybackClock) -> None:
+        """
+        Build a time-sorted event list from the grouped notes, the start times are sorted once and then walked with a cursor.
+        @param notes_by_timestamp - A dictionary mapping start times to lists of notes, or a note table sorted by start
+        @param clock: PlaybackClock - The clock mapping wall time to piece time
+        @return None
+        """
+        self.table = None
+        self.offsets = []
+
+        if isinstance(notes_by_timestamp, numpy.ndarray):
+            # Chords are runs of equal start times, so a chord is just a slice of the table between two offsets
+            starts = notes_by_timestamp.start
+            first = numpy.flatnonzero(numpy.r_[True, starts[1:] != starts[:-1]]) if len(starts) else numpy.empty(0, dtype=numpy.int64)
+
+            self.table = notes_by_timestamp
+            self.timestamps : list = starts[first].tolist()
+            self.offsets = first.tolist() + [len(starts)]
+            self.events : list = []
+            self.controls = notes_by_timestamp[notes_by_timestamp.pedal != 0] if len(starts) else notes_by_timestamp
+        else:
+            self.timestamps : list = sorted(notes_by_timestamp.keys())
+            self.events : list = [notes_by_timestamp[timestamp] for timestamp in self.timestamps]
+            self.controls = to_note_table({0: [note for notes in self.events for note in notes if note.pedal]})
+        self.sustain_timeline = SustainTimeline(self.controls)
+
+        self.cursor : int = 0
+
+        self.note_offs = [] # -> Min-heap of (end, sequence, note) so the earliest note-off is always at the top
+        self.note_off_sequence : int = 0
+        self.active = {} # -> (instrument index, pitch) -> pressed notes on that key that have not reached their end yet
+
+        self.sustain = set() # -> Instrument indices holding the sustain pedal down
+        self.sustained = {} # -> Instrument index -> notes whose note-off came while its pedal was down
+
+        self.clock : PlaybackClock = clock
+        self.MAX_SLEEP = 0.05 # -> Longest single wait, a fallback for is_running changing without the clock being woken
+
+        self.jitter = []
+
+    def finished(self) -> bool:
+        """
+        Check whether every event has been delivered and every held note has been released.
+        @return True if the cursor is past the last event and no note-offs are pending
+        """
+        return self.cursor >= len(self.timestamps) and not self.note_offs
+
+    def next_event_time(self):
+        """
+        Get the piece time of the next undelivered event, either a chord start or a pending note-off.
+        @return The time of the next event, or None if there are no events left
+        """
+        next_time = None
+        if self.cursor < len(self.timestamps):
+            next_time = self.timestamps[self.cursor]
+
+        if self.note_offs and (next_time is None or self.note_offs[0][0] < next_time):
+            next_time = self.note_offs[0][0]
+
+        return next_time
+
+    def seek(self, piece_time : float) -> None:
+        """
+        Move the cursor so the next delivered event is the first one starting at or after the given piece time.
+        @param piece_time: float - The piece time to move to
+        @return None
+        """
+        self.cursor = bisect.bisect_left(self.timestamps, piece_time)
+        self.sustain = self.sustain_timeline.get_sustained_instruments(piece_time, False) # the pedal changes at piece_time are delivered with the events there
+
+    def get_piece_time(self) -> float:
+        return self.clock.now()
+
+    def pop_due(self, piece_time : float) -> list:
+        """
+        Collect every event whose start time falls in the elapsed window, so late wake ups merge chords instead of dropping them.
+        @param piece_time: float - The current piece time
+        @return A list of all the notes that are due, or a slice of the note table
+        """
+        end = bisect.bisect_right(self.timestamps, piece_time, self.cursor)
+
+        if self.table is not None:
+            due = self.table[self.offsets[self.cursor]:self.offsets[end]]
+            self.cursor = end
+            return due
+
+        due = []
+        for note_array in self.events[self.cursor:end]:
+            due += note_array
+
+        self.cursor = end
+        return due
+
+    def push_note_off(self, note) -> None:
+        """
+        Schedule the release of a pressed note at its own end time.
+        @param note: N_Note - The note that was just pressed
+        @return None
+        """
+        heapq.heappush(self.note_offs, (note.end, self.note_off_sequence, note))
+        self.note_off_sequence += 1
+
+        key = (int(note.instrument_index), int(note.pitch))
+        self.active[key] = self.active.get(key, 0) + 1
+
+    def pop_due_note_offs(self, piece_time : float) -> list:
+        """
+        Collect every pressed note whose end time has been reached, earliest first.
+        A key struck again before an earlier note on it ended stays down until the last of them ends.
+        @param piece_time: float - The current piece time
+        @return A list of the notes to release
+        """
+        due = []
+        while self.note_offs and self.note_offs[0][0] <= piece_time:
+            note = heapq.heappop(self.note_offs)[2]
+
+            key = (int(note.instrument_index), int(note.pitch))
+            remaining = self.active.get(key, 1) - 1
+            if remaining > 0:
+                self.active[key] = remaining
+                continue # -> A later note on the same key is still sounding
+            self.active.pop(key, None)
+
+            if note.instrument_index in self.sustain:
+                self.sustained.setdefault(note.instrument_index, []).append(note) # released when the pedal comes up
+            else:
+                due.append(note)
+        return due
+
+    def apply_control(self, control) -> list:
+        """
+        Track a control change from the event stream.
+        @param control - A row or N_Note with pedal set, the controller number in pitch and the value in velocity
+        @return A list of the notes to release now, the ones the pedal was holding when it came up
+        """
+        if control.pitch != SUSTAIN_CONTROLLER:
+            return []
+
+        instrument_index = int(control.instrument_index)
+        if control.velocity >= SUSTAIN_THRESHOLD:
+            self.sustain.add(instrument_index)
+            return []
+
+        self.sustain.discard(instrument_index)
+        return self.sustained.pop(instrument_index, [])
+
+    def is_sounding(self, note) -> bool:
+        # Whether an earlier note on the same key has been pressed and not yet reached its end
+        return self.active.get((int(note.instrument_index), int(note.pitch)), 0) > 0
+
+    def pop_restruck(self, note):
+        """
+        Take a note that the pedal is holding out of the sustained notes when its key is struck again, so it can be released before the new one sounds.
+        @param note - The note about to be pressed
+        @return The held note on the same pitch, or None
+        """
+        held = self.sustained.get(int(note.instrument_index))
+        if not held:
+            return None
+
+        for index, other in enumerate(held):
+            if other.pitch == note.pitch:
+                return held.pop(index)
+        return None
+
+    def drain_note_offs(self) -> list:
+        """
+        Remove every pending note-off regardless of time and let go of the pedal, used when playback is stopped early or jumps.
+        @return A list of the notes that are still held
+        """
+        due = [note for notes in self.sustained.values() for note in notes]
+        due += [note for _, _, note in sorted(self.note_offs)]
+        self.note_offs = []
+        self.active = {}
+        self.sustained = {}
+        self.sustain = set()
+        return due
+
+    def wait_for_next_event(self, is_running = None) -> None:
+        """
+        Sleep until the next event is due, recording how late the wake up was.
+        The wait is cut short whenever the clock changes, so a new rate, seek or loop wrap is picked up straight away.
+        @param is_running - Optional callable, the wait is abandoned once it returns False
+        @return None
+        """
+        next_time = self.next_event_time()
+        if next_time is None:
+            if self.clock.loop is None:
+                return
+            next_time = float('inf') # -> Nothing left to play, but the loop will bring us back round
+
+        version = self.clock.version
+        while True:
+            if is_running is not None and not is_running():
+                return
+
+            time_to_wait = self.clock.get_wait(next_time)
+            if self.clock.version != version:
+                return
+
+            if time_to_wait <= 0:
+                break
+
+            if self.clock.wait_for_change(version, min(time_to_wait, self.MAX_SLEEP)):
+                return
+
+        self.jitter.append(-time_to_wait)
+
+    def get_jitter_stats(self) -> dict:
+        """
+        Summarise how late the scheduler woke up for its events.
+        @return A dictionary with the event count and the mean, p95 and max lateness in milliseconds
+        """
+        if not self.jitter:
+            return {'events': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+
+        ordered = sorted(self.jitter)
+        return {
+            'events': len(ordered),
+            'mean_ms': sum(ordered) / len(ordered) * 1000,
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            'max_ms': ordered[-1] * 1000,
+        }
+
+class StreamScheduler(EventScheduler):
+    def __init__(self, note_stream, clock : PlaybackClock) -> None:
+        """
+        An EventScheduler fed by a generator of start-sorted notes, pulling only as far ahead as the next chord.
+        @param note_stream - An iterator of notes sorted by start time, like MidiParser.stream_midi
+        @param clock: PlaybackClock - The clock mapping wall time to piece time
+        @return None
+        """
+        super().__init__({}, clock)
+
+        self.note_stream = iter(note_stream)
+        self.next_note = next(self.note_stream, None)
+
+    def finished(self) -> bool:
+        return self.next_note is None and not self.note_offs
+
+    def next_event_time(self):
+        next_time = None if self.next_note is None else self.next_note.start
+
+        if self.note_offs and (next_time is None or self.note_offs[0][0] < next_time):
+            next_time = self.note_offs[0][0]
+
+        return next_time
+
+    def seek(self, piece_time : float) -> None:
+        error('A streamed piece can only be played forwards.')
+
+    def pop_due(self, piece_time : float) -> list:
+        due = []
+        while self.next_note is not None and self.next_note.start <= piece_time:
+            due.append(self.next_note)
+            self.next_note = next(self.note_stream, None)
+        return due
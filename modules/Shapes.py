@@ -1,10 +1,19 @@
 import pygame
-import random
+import itertools
 from pygame.math import Vector2
 
+# Draw layers, lowest first. Objects in the same layer are drawn in the order they were inserted
+LAYER_BACKGROUND = 0
+LAYER_NOTES = 1
+LAYER_KEYS = 2
+LAYER_OVERLAY = 3
+LAYER_COUNT = 4
+
+shape_ids = itertools.count(1) # -> Handles are never reused, so a stale one can not point at a newer shape
+
 # I better not see ur ass using this for drawing / instancing shapes.
 class Shape:
-    def __init__(self, position : pygame.Vector2, size, colour):
+    def __init__(self, position : pygame.Vector2, size, colour, layer : int = LAYER_KEYS):
         self.position : pygame.Vector2 = pygame.Vector2(position)
         self.size = size
 
@@ -14,31 +23,32 @@ class Shape:
         self.colour = colour
         self.original_colour = self.colour
         
-        self.ID = random.randint(0, 256*128)
+        self.ID : int = next(shape_ids)
+        self.layer : int = layer
         self.border_radius = 2
 
     def draw(self, surface):
         return self.object
     
 class Square(Shape):
-    def __init__(self, position: Vector2, size: Vector2, colour):
-        super().__init__(position, size, colour)
+    def __init__(self, position: Vector2, size: Vector2, colour, layer : int = LAYER_KEYS):
+        super().__init__(position, size, colour, layer)
 
     def draw(self, surface):
         self.object = pygame.draw.rect(surface, self.colour, (*self.position, *self.size), border_radius=self.border_radius)
         return self.object, self.size, self.colour
 
 class Circle(Shape):
-    def __init__(self, position : pygame.Vector2, radius, colour):
-        super().__init__(position, radius, colour)
+    def __init__(self, position : pygame.Vector2, radius, colour, layer : int = LAYER_KEYS):
+        super().__init__(position, radius, colour, layer)
 
     def draw(self, surface):
         self.object = pygame.draw.circle(surface, self.colour, (int(self.position.x), int(self.position.y)), self.size, radius=self.border_radius)
         return self.object, self.size, self.colour
 
 class ImageRect(Shape):
-    def __init__(self, position: Vector2, image_path: str):
-        super().__init__(position, None, None)
+    def __init__(self, position: Vector2, image_path: str, layer : int = LAYER_BACKGROUND):
+        super().__init__(position, None, None, layer)
         self.image = pygame.image.load(image_path)
         self.size = Vector2(self.image.get_width(), self.image.get_height())
 
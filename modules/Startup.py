@@ -0,0 +1,87 @@
+import sys, time, threading, pygame
+
+from modules.Output import *
+
+# Backends that are only imported by the modes that use them, listed in the report to show which ones a run actually loaded
+DEFERRED_BACKENDS = ('pretty_midi', 'mido', 'rtmidi', 'pygame.midi', 'asyncio', 'concurrent.futures.process')
+
+class StartupReport:
+    def __init__(self) -> None:
+        """
+        Time the stages between this module being imported, the first thing main does, and the first frame reaching the screen.
+        @return None
+        """
+        self.started : float = time.perf_counter()
+        self.stages = [] # -> (name, seconds) in the order they ran
+        self.enabled : bool = False # -> Write the breakdown out once the first frame is shown
+        self.finished : bool = False
+
+    def stage(self, name : str):
+        return StartupStage(self, name)
+
+    def finish(self) -> None:
+        """
+        Mark the first frame as shown, and write the breakdown out if it was asked for.
+        @return None
+        """
+        self.finished = True
+        if not self.enabled:
+            return
+
+        total = time.perf_counter() - self.started
+        accounted = sum(seconds for _, seconds in self.stages)
+
+        lines = [f'{name:<24} {seconds * 1000:7.1f}ms' for name, seconds in self.stages]
+        lines.append(f"{'other':<24} {(total - accounted) * 1000:7.1f}ms")
+        lines.append(f"{'first frame after':<24} {total * 1000:7.1f}ms")
+
+        loaded = [name for name in DEFERRED_BACKENDS if name in sys.modules]
+        output('Startup breakdown:\n' + '\n'.join(lines) + f"\nBackends loaded so far: {', '.join(loaded) or 'none'}")
+
+class StartupStage:
+    __slots__ = ('report', 'name', 'start')
+
+    def __init__(self, report : StartupReport, name : str) -> None:
+        self.report : StartupReport = report
+        self.name : str = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.report.stages.append((self.name, time.perf_counter() - self.start))
+
+startup = StartupReport()
+
+init_lock = threading.Lock()
+initialised = set() # -> The subsystems that have been initialised in this process
+
+def init_pygame() -> None:
+    """
+    Initialise the display and font modules of pygame, once per process however many times it is called.
+    Only what the visualiser uses is started, pygame.init would also open the audio device and scan for joysticks.
+    @return None
+    """
+    with init_lock:
+        if 'pygame' in initialised:
+            return
+
+        pygame.display.init()
+        pygame.font.init()
+        initialised.add('pygame')
+
+def init_pygame_midi() -> None:
+    with init_lock:
+        if 'pygame.midi' in initialised:
+            return
+
+        from pygame import midi
+        midi.init()
+        initialised.add('pygame.midi')
+
+def quit_pygame() -> None:
+    # Everything has to be initialised again after this, like a second Scene in the same process
+    with init_lock:
+        pygame.quit()
+        initialised.clear()